@@ -3,10 +3,13 @@
 import os
 import jwt
 import time
+import hashlib
 
-from typing import Dict
-from fastapi import APIRouter, Depends, HTTPException, Request
+from collections import OrderedDict
+from typing import Dict, Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.security import HTTPBearer
+from app.api.keyring import KeyRing
 from app.config import settings
 
 auth = APIRouter()
@@ -18,6 +21,20 @@ JWT_REFRESH_SECRET = settings.JWT_REFRESH_SECRET
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_DAYS = 30
 
+# Access tokens are signed by the key ring when one is configured, so other
+# services can verify them offline against the published JWKS. Refresh tokens
+# are only ever checked here and stay on the shared HMAC secret.
+keyring = (
+    KeyRing.from_directory(settings.JWT_KEYS_DIR, settings.JWT_ACTIVE_KID)
+    if settings.JWT_KEYS_DIR
+    else None
+)
+
+# Access tokens are reused for up to an hour, so remember the ones whose
+# signature already checked out (keyed by a hash, never the token itself)
+TOKEN_CACHE_SIZE = settings.JWT_CACHE_SIZE
+verified_tokens: "OrderedDict[str, dict]" = OrderedDict()
+
 
 def create_jwt_token(user_data: dict) -> Dict[str, str]:
     """Create JWT token for authenticated user"""
@@ -36,7 +53,12 @@ def create_jwt_token(user_data: dict) -> Dict[str, str]:
         "type": "refresh",
     }
 
-    access_token = jwt.encode(access_payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    if keyring is not None:
+        access_token = keyring.sign(access_payload)
+    else:
+        access_token = jwt.encode(
+            access_payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM
+        )
     refresh_token = jwt.encode(
         refresh_payload, JWT_REFRESH_SECRET, algorithm=JWT_ALGORITHM
     )
@@ -48,11 +70,42 @@ def create_jwt_token(user_data: dict) -> Dict[str, str]:
     }
 
 
+def cached_claims(token_hash: str) -> Optional[dict]:
+    payload = verified_tokens.get(token_hash)
+    if payload is None:
+        return None
+    if payload["exp"] < time.time():
+        # Never serve a token past its exp; the full check reports the expiry
+        del verified_tokens[token_hash]
+        return None
+    verified_tokens.move_to_end(token_hash)
+    # A copy: callers editing their claims must not edit the cache entry
+    return dict(payload)
+
+
+def remember_claims(token_hash: str, payload: dict):
+    verified_tokens[token_hash] = dict(payload)
+    while len(verified_tokens) > TOKEN_CACHE_SIZE:
+        verified_tokens.popitem(last=False)
+
+
 def verify_jwt_token(token: str, is_refresh: bool = False) -> dict:
     """Verify JWT token and return payload"""
+    use_cache = not is_refresh and TOKEN_CACHE_SIZE > 0
+    if use_cache:
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        payload = cached_claims(token_hash)
+        if payload is not None:
+            return payload
+
     try:
-        secret = JWT_REFRESH_SECRET if is_refresh else JWT_SECRET_KEY
-        payload = jwt.decode(token, secret, algorithms=[JWT_ALGORITHM])
+        if is_refresh:
+            payload = jwt.decode(token, JWT_REFRESH_SECRET, algorithms=[JWT_ALGORITHM])
+        elif keyring is not None and "kid" in jwt.get_unverified_header(token):
+            payload = keyring.verify(token)
+        else:
+            # HMAC tokens issued before the key ring was enabled
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
 
         # Verify token type
         expected_type = "refresh" if is_refresh else "access"
@@ -62,13 +115,20 @@ def verify_jwt_token(token: str, is_refresh: bool = False) -> dict:
         if payload["exp"] < time.time():
             raise HTTPException(status_code=401, detail="Token has expired")
 
+        if use_cache:
+            remember_claims(token_hash, payload)
         return payload
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-async def get_current_user(token: HTTPBearer = Depends(security)):
+async def get_current_user(request: Request, token: HTTPBearer = Depends(security)):
     """Dependency to get current user from JWT token"""
+    # JWTMiddleware has already verified the token on protected routes
+    claims = getattr(request.state, "user", None)
+    if claims is not None:
+        return claims
+
     try:
         payload = verify_jwt_token(token.credentials)
         return payload
@@ -109,6 +169,15 @@ async def refresh_tokens(request: Request):
         raise e
 
 
+@auth.get("/.well-known/jwks.json")
+async def jwks(response: Response):
+    """Public keys for verifying access tokens without calling this service"""
+    response.headers["Cache-Control"] = (
+        f"public, max-age={settings.JWT_JWKS_MAX_AGE}"
+    )
+    return keyring.jwks() if keyring is not None else {"keys": []}
+
+
 @auth.get("/protected")
 async def protected_route(current_user: dict = Depends(get_current_user)):
     return {"message": "This is protected", "user": current_user}
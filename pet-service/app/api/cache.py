@@ -0,0 +1,394 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from app.api.metrics import SINGLE_FLIGHT_MERGED, SINGLE_FLIGHT_TIMEOUTS
+from app.api.middleware import logger
+from app.config import settings
+
+INVALIDATION_CHANNEL = "pet-service:cache-invalidation"
+CLEAR_ALL = "*"
+
+
+def pet_key(pet_id: str) -> str:
+    return f"pet:{pet_id}"
+
+
+def breeder_key(breeder_id: str) -> str:
+    return f"breeder:{breeder_id}"
+
+
+def stats_key(dimension: str, value: Optional[str], limit: int, offset: int) -> str:
+    # JSON, so value=None and the string "None" (or a value holding ":")
+    # cannot share a key
+    return "stats:" + json.dumps([dimension, value, limit, offset])
+
+
+class MemoryCache:
+    """In-process LRU cache whose entries also expire after a TTL"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        found = {}
+        for key in keys:
+            value = await self.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set_many(self, items: Dict[str, Any]):
+        for key, value in items.items():
+            await self.set(key, value)
+
+    async def delete(self, keys: Iterable[str]):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisCache:
+    """Cache shared by every worker, stored as JSON in Redis"""
+
+    def __init__(self, redis, ttl: float = 30.0, prefix: str = "pet-service:"):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any):
+        await self.redis.set(
+            self.prefix + key, json.dumps(value), px=int(self.ttl * 1000)
+        )
+
+    async def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        if not keys:
+            return {}
+        raws = await self.redis.mget([self.prefix + key for key in keys])
+        return {
+            key: json.loads(raw) for key, raw in zip(keys, raws) if raw is not None
+        }
+
+    async def set_many(self, items: Dict[str, Any]):
+        # One round trip for the whole batch
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(self.prefix + key, json.dumps(value), px=int(self.ttl * 1000))
+            await pipe.execute()
+
+    async def delete(self, keys: Iterable[str]):
+        keys = [self.prefix + key for key in keys]
+        if keys:
+            await self.redis.delete(*keys)
+
+    async def clear(self):
+        async for key in self.redis.scan_iter(match=self.prefix + "*"):
+            await self.redis.delete(key)
+
+
+class LocalInvalidationBus:
+    """In-process stand-in for the cross-worker invalidation channel"""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[List[str]], Awaitable[None]]] = []
+
+    def subscribe(self, callback: Callable[[List[str]], Awaitable[None]]):
+        self._subscribers.append(callback)
+
+    async def publish(self, keys: List[str]):
+        for callback in self._subscribers:
+            await callback(keys)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class RedisInvalidationBus(LocalInvalidationBus):
+    """Fans invalidations out to every gunicorn worker through Redis pub/sub"""
+
+    def __init__(self, redis, channel: str = INVALIDATION_CHANNEL):
+        super().__init__()
+        self.redis = redis
+        self.channel = channel
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, keys: List[str]):
+        await self.redis.publish(self.channel, json.dumps(keys))
+
+    async def start(self):
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            keys = json.loads(message["data"])
+            await super().publish(keys)
+
+
+class LoadTimeout(Exception):
+    """A lookup waited longer than its timeout for a load to finish"""
+
+
+class SingleFlight:
+    """Merges concurrent loads of the same key into one call.
+
+    The first caller for a key starts the load; callers arriving while it is
+    in flight wait for its result instead of running the query again. Each
+    caller waits at most ``timeout`` seconds and then raises LoadTimeout,
+    while the load itself runs on for whoever is still waiting: a caller
+    giving up, or going away, never cancels it for the others.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.loads = 0
+        self.merged = 0
+        self.timeouts = 0
+        self._flights: Dict[str, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ):
+        kind = key.partition(":")[0]
+        flight = self._flights.get(key)
+        if flight is None:
+            self.loads += 1
+            flight = asyncio.create_task(loader())
+            flight.add_done_callback(lambda task: self._landed(key, task))
+            self._flights[key] = flight
+        else:
+            self.merged += 1
+            SINGLE_FLIGHT_MERGED.labels(kind).inc()
+
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(asyncio.shield(flight), timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            SINGLE_FLIGHT_TIMEOUTS.labels(kind).inc()
+            raise LoadTimeout(f"Timed out after {timeout}s loading {key}")
+
+    def forget(self, keys: Iterable[str]):
+        """Let later callers start a fresh load instead of joining one that
+        may have read the data before a write"""
+        for key in keys:
+            self._flights.pop(key, None)
+
+    def forget_all(self):
+        self._flights.clear()
+
+    def _landed(self, key: str, task: asyncio.Task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Mark the error as seen even when every waiter has given up on it
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "loads": self.loads,
+            "merged": self.merged,
+            "timeouts": self.timeouts,
+            "in_flight": len(self._flights),
+        }
+
+
+class ResponseCache:
+    """Read-through cache for pet lookups with explicit invalidation.
+
+    ``backend`` is None when caching is disabled, in which case every lookup
+    goes straight to the loader. Either way, concurrent loads of the same key
+    are merged by ``flights``.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        bus: Optional[LocalInvalidationBus] = None,
+        flights: Optional[SingleFlight] = None,
+    ):
+        self.backend = backend
+        self.bus = bus
+        self.flights = flights if flights is not None else SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a load racing with a write never
+        # stores the value it read before the write
+        self._epoch = 0
+        if bus is not None:
+            bus.subscribe(self._on_remote_invalidation)
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]):
+        if self.backend is None:
+            return await self.flights.do(key, loader)
+
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        epoch = self._epoch
+        value = await self.flights.do(key, loader)
+        if value is not None and epoch == self._epoch:
+            await self.backend.set(key, value)
+        return value
+
+    async def get_many_or_load(
+        self,
+        keys: List[str],
+        loader: Callable[[List[str]], Awaitable[Dict[str, Any]]],
+    ) -> Dict[str, Any]:
+        """Batch form of get_or_load: ``loader`` gets the keys that missed and
+        returns the values it found by key. Keys with no value are left out.
+        """
+        if self.backend is None:
+            return await loader(keys)
+
+        found = await self.backend.get_many(keys)
+        self.hits += len(found)
+        missing = [key for key in keys if key not in found]
+        if not missing:
+            return found
+
+        self.misses += len(missing)
+        epoch = self._epoch
+        loaded = await loader(missing)
+        if loaded and epoch == self._epoch:
+            await self.backend.set_many(loaded)
+        return {**found, **loaded}
+
+    async def invalidate(self, keys: Iterable[str]):
+        keys = list(dict.fromkeys(keys))
+        self.flights.forget(keys)
+        if self.backend is None:
+            return
+        self._epoch += 1
+        self.invalidations += len(keys)
+        await self.backend.delete(keys)
+        if self.bus is not None:
+            await self.bus.publish(keys)
+
+    async def invalidate_all(self):
+        self.flights.forget_all()
+        if self.backend is None:
+            return
+        self._epoch += 1
+        await self.backend.clear()
+        if self.bus is not None:
+            await self.bus.publish([CLEAR_ALL])
+
+    async def start(self):
+        if self.bus is not None:
+            await self.bus.start()
+
+    async def stop(self):
+        if self.bus is not None:
+            await self.bus.stop()
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "single_flight": self.flights.stats(),
+        }
+
+    async def _on_remote_invalidation(self, keys: List[str]):
+        self._epoch += 1
+        if CLEAR_ALL in keys:
+            self.flights.forget_all()
+            await self.backend.clear()
+        else:
+            self.flights.forget(keys)
+            await self.backend.delete(keys)
+
+
+def build_cache() -> ResponseCache:
+    """Build the cache configured by CACHE_BACKEND and REDIS_URL"""
+    backend_name = settings.CACHE_BACKEND.lower()
+    flights = SingleFlight(settings.SINGLE_FLIGHT_TIMEOUT)
+    if backend_name == "none":
+        return ResponseCache(flights=flights)
+
+    redis = None
+    if settings.REDIS_URL:
+        # Optional dependency, only needed when Redis is configured
+        import redis.asyncio as aioredis
+
+        redis = aioredis.from_url(settings.REDIS_URL)
+
+    if backend_name == "redis":
+        if redis is None:
+            raise ValueError("CACHE_BACKEND=redis requires REDIS_URL")
+        return ResponseCache(
+            RedisCache(redis, ttl=settings.CACHE_TTL_SECONDS), flights=flights
+        )
+
+    if backend_name != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND: {settings.CACHE_BACKEND}")
+
+    # Per-worker LRUs; with Redis available, writes on one worker evict the
+    # entry from every other worker too
+    backend = MemoryCache(settings.CACHE_MAX_ENTRIES, ttl=settings.CACHE_TTL_SECONDS)
+    bus = RedisInvalidationBus(redis) if redis is not None else None
+    if bus is None:
+        logger.info("Memory cache without REDIS_URL: invalidation is per-worker")
+    return ResponseCache(backend, bus, flights)
+
+
+pet_cache = build_cache()
@@ -1,31 +1,148 @@
+import asyncio
+import time
+from collections import deque
+from typing import List, Optional
+
 import httpx
 from app.config import settings
+from app.api.metrics import CAT_API_ERRORS, CAT_API_LATENCY
 from app.api.middleware import logger
 
+# The Cat API caps how many images one search call may return
+MAX_BATCH_SIZE = 25
+REFILL_RETRY_SECONDS = 5.0
+
+# Shared per-process client and prefetch pool, managed by the app lifespan
+client: Optional[httpx.AsyncClient] = None
+image_pool: Optional["ImagePrefetchPool"] = None
+
 
 class CatAPIAdapter:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         """
         Initialize the adapter with the API key.
-        :param api_key: Your API key for The Cat API.
+        :param client: Optional httpx client; defaults to the shared one.
         """
-        self.base_url = "https://api.thecatapi.com/v1/images/search"
+        self.base_url = settings.CAT_API_URL
         self.headers = {"x-api-key": settings.CAT_API_KEY}
+        self.client = client
 
-    async def retrieve_image(self) -> dict:
+    async def retrieve_image(self) -> Optional[str]:
         """
-        Makes an API call to retrieve a cat image.
-        :return: A dictionary containing image data from the API response.
+        Returns a cat image URL, served from the prefetch pool when possible.
+        :return: An image URL, or the configured fallback if none is available.
+        """
+        if image_pool is not None:
+            url = image_pool.pop()
+            if url:
+                return url
+
+        images = await self.retrieve_images(1)
+        return images[0] if images else settings.CAT_API_FALLBACK_IMAGE_URL
+
+    async def retrieve_images(self, limit: int = 1) -> List[str]:
         """
-        async with httpx.AsyncClient() as client:
+        Makes a single API call for up to ``limit`` cat images.
+        :return: A list of image URLs; empty if the call failed.
+        """
+        params = {"limit": min(limit, MAX_BATCH_SIZE)} if limit > 1 else None
+        start = time.perf_counter()
+        try:
+            http_client = self.client or client
+            if http_client is None:
+                # Lifespan has not run (e.g. scripts); fall back to a one-off client
+                async with httpx.AsyncClient(
+                    timeout=settings.CAT_API_TIMEOUT
+                ) as one_off:
+                    response = await one_off.get(
+                        self.base_url, headers=self.headers, params=params
+                    )
+            else:
+                response = await http_client.get(
+                    self.base_url, headers=self.headers, params=params
+                )
+            response.raise_for_status()  # Raise an HTTPStatusError for 4xx and 5xx
+            data = response.json()
+            if not isinstance(data, list) or not all(
+                isinstance(item, dict) for item in data
+            ):
+                raise ValueError(f"Expected a list of images, got {data!r:.200}")
+        except (httpx.HTTPError, ValueError) as e:
+            CAT_API_LATENCY.labels("error").observe(time.perf_counter() - start)
+            CAT_API_ERRORS.labels(type(e).__name__).inc()
+            logger.warning(f"An error occurred while making the API call: {e}")
+            return []
+
+        CAT_API_LATENCY.labels("ok").observe(time.perf_counter() - start)
+        return [item["url"] for item in data if item.get("url")]
+
+
+class ImagePrefetchPool:
+    """Buffer of image URLs topped up in the background with batched calls,
+    so create_pet pops a URL instead of waiting on the external API."""
+
+    def __init__(self, adapter: CatAPIAdapter, size: int):
+        self.adapter = adapter
+        self.size = size
+        self._urls = deque(maxlen=size)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    def pop(self) -> Optional[str]:
+        url = self._urls.popleft() if self._urls else None
+        # Refill once the buffer drops to its low watermark
+        if len(self._urls) <= self.size // 2:
+            self._wakeup.set()
+        return url
+
+    def start(self):
+        self._task = asyncio.create_task(self._refill())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
             try:
-                response = await client.get(self.base_url, headers=self.headers)
-                response.raise_for_status()  # Raise an HTTPStatusError for bad responses (4xx and 5xx)
-                data = response.json()
-                if data:
-                    return data[0].get("url")
-                else:
-                    raise ValueError("No data returned from the API.")
-            except httpx.RequestError as e:
-                logger.warning(f"An error occurred while making the API call: {e}")
-                return None
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _refill(self):
+        while True:
+            self._wakeup.clear()
+            missing = self.size - len(self._urls)
+            if missing <= 0:
+                await self._wakeup.wait()
+                continue
+
+            try:
+                urls = await self.adapter.retrieve_images(missing)
+            except Exception as e:
+                logger.warning(f"Prefetching cat images failed: {e}")
+                urls = []
+            self._urls.extend(urls)
+            if not urls:
+                # API unavailable; back off instead of hammering it
+                await asyncio.sleep(REFILL_RETRY_SECONDS)
+
+
+async def initialize_cat_api():
+    """Create the shared client and start prefetching (call from lifespan)"""
+    global client, image_pool
+    client = httpx.AsyncClient(timeout=settings.CAT_API_TIMEOUT)
+    if settings.CAT_API_PREFETCH_SIZE > 0:
+        image_pool = ImagePrefetchPool(CatAPIAdapter(), settings.CAT_API_PREFETCH_SIZE)
+        image_pool.start()
+
+
+async def cleanup_cat_api():
+    global client, image_pool
+    if image_pool is not None:
+        await image_pool.stop()
+        image_pool = None
+    if client is not None:
+        await client.aclose()
+        client = None
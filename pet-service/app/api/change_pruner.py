@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.api import db_manager
+from app.api.middleware import logger
+from app.config import settings
+
+
+class ChangePruner:
+    """Deletes the /pets/changes entries older than ``retention`` seconds,
+    every ``interval`` seconds, so the outbox does not grow without bound.
+
+    Never prunes changes younger than CHANGES_GAP_TIMEOUT: gaps before them
+    may still fill in. A prune that takes a full batch is followed straight
+    away by the next. A retention of 0 keeps every change.
+    """
+
+    def __init__(
+        self, retention: float, interval: float = 60.0, batch_size: int = 10000
+    ):
+        self.retention = retention
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pruned = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        if self.retention > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "retention": self.retention,
+            "pruned": self.pruned,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                pruned = await self.prune()
+            except Exception as e:
+                self.failed += 1
+                pruned = 0
+                logger.warning(f"Pruning pet changes failed: {e}")
+            if pruned < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    async def prune(self) -> int:
+        keep = max(self.retention, settings.CHANGES_GAP_TIMEOUT)
+        pruned = await db_manager.prune_changes(time.time() - keep, self.batch_size)
+        self.pruned += pruned
+        return pruned
+
+
+change_pruner = ChangePruner(
+    retention=settings.CHANGES_RETENTION_SECONDS,
+    interval=settings.CHANGES_PRUNE_INTERVAL,
+    batch_size=settings.CHANGES_PRUNE_BATCH,
+)
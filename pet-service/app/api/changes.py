@@ -0,0 +1,96 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List
+
+from app.api import db
+from app.api.middleware import logger
+from app.config import settings
+
+CHANGES_CHANNEL = "pet_changes"
+
+
+class ChangeFeed:
+    """Wakes long-polls and event streams on /pets/changes when pets change.
+
+    Writes made by this process wake waiters directly. With ``listen`` on
+    Postgres, a LISTEN connection brings in the writes of other workers as
+    well; without it, waiters re-check every ``poll_interval`` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, listen: bool = False):
+        self.poll_interval = poll_interval
+        self.listen = listen
+        self.waiting = 0
+        self.notifications = 0
+        self._changed = asyncio.Event()
+        self._connection = None
+
+    @property
+    def listening(self) -> bool:
+        return self._connection is not None
+
+    def notify(self):
+        """Wake everyone waiting for changes"""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(
+        self, load: Callable[[], Awaitable[List[Any]]], timeout: float
+    ) -> List[Any]:
+        """Return what ``load`` finds, waiting up to ``timeout`` seconds for it
+        to find anything"""
+        deadline = time.monotonic() + timeout
+        while True:
+            # Taken before loading, so a change landing in between still wakes
+            changed = self._changed
+            found = await load()
+            remaining = deadline - time.monotonic()
+            if found or remaining <= 0:
+                return found
+
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    changed.wait(), min(remaining, self.poll_interval)
+                )
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self.waiting -= 1
+
+    async def start(self):
+        if not self.listen:
+            return
+        if db.database.url.dialect != "postgresql":
+            logger.warning("CHANGES_NOTIFY needs Postgres; polling instead")
+            return
+
+        import asyncpg
+
+        # A connection of its own: LISTEN holds it for the process lifetime
+        self._connection = await asyncpg.connect(
+            str(db.database.url).replace("postgresql+asyncpg://", "postgresql://")
+        )
+        await self._connection.add_listener(CHANGES_CHANNEL, self._on_notify)
+
+    async def stop(self):
+        if self._connection is None:
+            return
+        await self._connection.close()
+        self._connection = None
+
+    def stats(self) -> dict:
+        return {
+            "listening": self.listening,
+            "waiting": self.waiting,
+            "notifications": self.notifications,
+        }
+
+    def _on_notify(self, *args):
+        self.notifications += 1
+        self.notify()
+
+
+change_feed = ChangeFeed(
+    poll_interval=settings.CHANGES_POLL_INTERVAL, listen=settings.CHANGES_NOTIFY
+)
@@ -1,19 +1,29 @@
 import os
-import uuid
+import time
 import asyncio
+from typing import Optional
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Integer,
     MetaData,
     String,
     Table,
+    Index,
     ARRAY,
     Float,
+    Text,
 )
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
-from databases import Database
+from databases import Database, DatabaseURL
+from app.api.metrics import (
+    DB_POOL_ACQUIRE_TIMEOUTS,
+    DB_POOL_ACQUIRE_WAIT,
+    DB_POOL_IN_USE,
+    DB_POOL_WAITING,
+)
+from app.api.migrations import apply_migrations
+from app.config import settings
 
 # Get environment variables
 DB_USER = os.getenv("DB_USER")
@@ -35,14 +45,18 @@ else:
     if DATABASE_URI and DATABASE_URI.startswith("postgresql://"):
         DATABASE_URI = DATABASE_URI.replace("postgresql://", "postgresql+asyncpg://")
 
-# Create async engine with unique prepared statement names
-engine = create_async_engine(
-    DATABASE_URI,
-    connect_args={
-        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
-        "statement_cache_size": 0,
-        "prepared_statement_cache_size": 0,
-    },
+
+def statement_cache_enabled() -> bool:
+    mode = settings.DB_STATEMENT_CACHE.lower()
+    if mode == "auto":
+        # Only a direct connection keeps prepared statements alive between
+        # transactions; transaction-pooling proxies hand out other backends
+        return bool(INSTANCE_UNIX_SOCKET)
+    return mode == "on"
+
+
+STATEMENT_CACHE_SIZE = (
+    settings.DB_STATEMENT_CACHE_SIZE if statement_cache_enabled() else 0
 )
 
 metadata = MetaData()
@@ -57,35 +71,208 @@ pets = Table(
     Column("price", Float),
     Column("breeder_id", String(36)),
     Column("image_url", String(255)),  # New column for the image URL
+    # Bumped on every write; backs ETags and If-Match optimistic concurrency
+    Column("version", Integer, nullable=False, server_default="1"),
+)
+
+# Mirrors of the indexes created by app.api.migrations. (type, id) backs keyset
+# (cursor) pagination; the name indexes for search differ per dialect and only
+# live in the migrations
+Index("ix_pets_breeder_id_id", pets.c.breeder_id, pets.c.id)
+Index("ix_pets_type_id", pets.c.type, pets.c.id)
+Index("ix_pets_price_id", pets.c.price, pets.c.id)
+
+# Outbox behind /pets/changes: one row per write, in the write's transaction
+pet_changes = Table(
+    "pet_changes",
+    metadata,
+    Column(
+        "seq",
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    ),
+    Column("op", String(10), nullable=False),  # create/update/delete/delete_all
+    Column("pet_id", String(36)),
+    Column("pet", Text),  # JSON of the row as written; null for deletes
+    Column("changed_at", Float, nullable=False),
+    sqlite_autoincrement=True,
+)
+
+# One row: the seq up to which pet_changes has been pruned (0 until the first
+# prune). /pets/changes reads on from it and answers 410 for anything older
+pet_changes_pruned = Table(
+    "pet_changes_pruned",
+    metadata,
+    Column("seq", BigInteger().with_variant(Integer, "sqlite"), nullable=False),
+)
+
+# /pets/stats aggregates, maintained by triggers and a background fold (see
+# the migrations and db_manager.fold_pet_stats). dimension is "type" or
+# "breeder"; bucket is a log-scale price histogram bucket
+pet_stat_deltas = Table(
+    "pet_stat_deltas",
+    metadata,
+    Column(
+        "seq",
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    ),
+    Column("dimension", String(10), nullable=False),
+    Column("value", String(50), nullable=False),
+    Column("bucket", Integer, nullable=False),
+    Column("count", Integer, nullable=False),  # +1, -1, or 0 to refresh a summary
+    Column("price", Float),
+    sqlite_autoincrement=True,
 )
 
-# Setup databases instance with the same connection parameters
+pet_stat_buckets = Table(
+    "pet_stat_buckets",
+    metadata,
+    Column("dimension", String(10), primary_key=True),
+    Column("value", String(50), primary_key=True),
+    Column("bucket", Integer, primary_key=True, autoincrement=False),
+    Column("count", Integer, nullable=False),
+    Column("price_sum", Float, nullable=False),
+    Column("min_price", Float),
+    Column("max_price", Float),
+)
+
+pet_stats = Table(
+    "pet_stats",
+    metadata,
+    Column("dimension", String(10), primary_key=True),
+    Column("value", String(50), primary_key=True),
+    Column("count", Integer, nullable=False),
+    Column("price_sum", Float, nullable=False),
+    Column("min_price", Float),
+    Column("max_price", Float),
+    Column("p50", Float),
+    Column("p90", Float),
+    Column("p99", Float),
+    Column("updated_at", Float, nullable=False),
+)
+
+
+class PoolAcquireTimeout(Exception):
+    """No pooled connection became free within DB_POOL_ACQUIRE_TIMEOUT"""
+
+
+class InstrumentedPool:
+    """Wraps the asyncpg pool behind ``database`` to bound how long a request
+    may wait for a connection and to record pool usage."""
+
+    def __init__(self, pool, acquire_timeout: float):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+        self.in_use = 0
+        self.waiting = 0
+        self.acquired = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+
+    async def acquire(self):
+        start = time.monotonic()
+        self.waiting += 1
+        DB_POOL_WAITING.inc()
+        try:
+            connection = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            DB_POOL_ACQUIRE_TIMEOUTS.inc()
+            raise PoolAcquireTimeout(
+                f"Timed out after {self.acquire_timeout}s waiting for a connection"
+            )
+        finally:
+            self.waiting -= 1
+            DB_POOL_WAITING.dec()
+            waited = time.monotonic() - start
+            self.acquire_wait_total += waited
+            self.acquire_wait_max = max(self.acquire_wait_max, waited)
+            DB_POOL_ACQUIRE_WAIT.observe(waited)
+
+        self.acquired += 1
+        self.in_use += 1
+        DB_POOL_IN_USE.inc()
+        return connection
+
+    async def release(self, connection):
+        self.in_use -= 1
+        DB_POOL_IN_USE.dec()
+        return await self._pool.release(connection)
+
+    def __getattr__(self, name):
+        # close(), get_size() and friends go straight to the real pool
+        return getattr(self._pool, name)
+
+    def stats(self) -> dict:
+        return {
+            "size": self._pool.get_size(),
+            "idle": self._pool.get_idle_size(),
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "acquire_timeouts": self.acquire_timeouts,
+            "acquire_wait_avg_ms": round(
+                self.acquire_wait_total * 1000 / max(self.acquired, 1), 3
+            ),
+            "acquire_wait_max_ms": round(self.acquire_wait_max * 1000, 3),
+        }
+
+
+def database_options(url: Optional[str]) -> dict:
+    """Pool options for ``url``; only asyncpg takes them, and the SQLite
+    backend rejects them"""
+    if url is None or DatabaseURL(url).dialect != "postgresql":
+        return {}
+    return {
+        "min_size": settings.DB_POOL_MIN_SIZE,
+        "max_size": settings.DB_POOL_MAX_SIZE,
+        "max_inactive_connection_lifetime": settings.DB_POOL_MAX_IDLE_SECONDS,
+        "server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)},
+        "ssl": None,
+        "statement_cache_size": STATEMENT_CACHE_SIZE,
+    }
+
+
+# Single connection pool per worker, used for queries and DDL alike
 database = Database(
-    DATABASE_URI,
-    min_size=1,
-    max_size=10,
-    force_rollback=False,
-    ssl=None,
-    statement_cache_size=0,
+    DATABASE_URI, force_rollback=False, **database_options(DATABASE_URI)
 )
 
 
-# Create tables asynchronously
-async def create_tables():
-    async with engine.begin() as conn:
-        if os.getenv("FASTAPI_ENV") == "production":
-            # Create table if it doesn't exist
-            await conn.run_sync(metadata.create_all, checkfirst=True)
-        else:
-            # Drop table if it exists, then create it again
-            await conn.run_sync(metadata.drop_all)
-            await conn.run_sync(metadata.create_all)
+def instrument_pool(database: Database):
+    """Put InstrumentedPool in front of the asyncpg pool of a connected
+    ``database``.
+
+    This swaps a private attribute of the databases Postgres backend, which
+    is why pyproject.toml pins databases to one version; test_db checks that
+    connections still come from the swapped pool.
+    """
+    backend = database._backend
+    if getattr(backend, "_pool", None) is None:
+        raise RuntimeError(
+            f"{type(backend).__name__} has no _pool to instrument; "
+            "check the databases version against pyproject.toml"
+        )
+    backend._pool = InstrumentedPool(backend._pool, settings.DB_POOL_ACQUIRE_TIMEOUT)
+
+
+def pool_stats() -> dict:
+    pool = getattr(database._backend, "_pool", None)
+    return pool.stats() if isinstance(pool, InstrumentedPool) else {}
 
 
 # Database setup function
 async def setup_database():
     await database.connect()
-    await create_tables()
+    if database.url.dialect == "postgresql":
+        instrument_pool(database)
+    await apply_migrations(database)
 
 
 # Function to initialize database (call this in your startup event)
@@ -103,6 +290,11 @@ async def cleanup():
     await database.disconnect()
 
 
-# If you need to create tables from command line
+# If you need to apply migrations from command line
+async def main():
+    await setup_database()
+    await cleanup()
+
+
 if __name__ == "__main__":
-    asyncio.run(create_tables())
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
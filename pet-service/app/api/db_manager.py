@@ -1,10 +1,71 @@
-from app.api.models import PetIn, PetOut
-from app.api.db import pets, database
-from typing import Optional
+from app.api.models import PetIn, PetOut, PetSearchParams
+from app.api.db import (
+    pets,
+    pet_changes,
+    pet_changes_pruned,
+    pet_stat_buckets,
+    pet_stat_deltas,
+    pet_stats,
+    database,
+)
+from app.api.cache import pet_cache, pet_key, breeder_key, stats_key
+from app.api.changes import change_feed
+from app.config import settings
+from app.api.metrics import timed_query
+from app.api.migrations import PRICE_BUCKET_GAMMA, ZERO_PRICE_BUCKET
+from sqlalchemy import (
+    ARRAY,
+    String,
+    any_,
+    bindparam,
+    case,
+    cast,
+    column,
+    func,
+    literal,
+    literal_column,
+    or_,
+    select,
+    table,
+    tuple_,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Dict, Optional, Sequence, Tuple
 from typing import List
+from collections import Counter
+from itertools import groupby
+import asyncio
+import json
+import math
+import time
 
+# Rows per multi-row INSERT; 500 rows x 6 columns stays well under the bind
+# parameter limits of both asyncpg and SQLite
+BULK_BATCH_SIZE = 500
 
+# Most frequent values reported per search facet
+FACET_LIMIT = 20
+# Facets and totals count at most this many matches; past it the total is a
+# lower bound, so a broad search does not count its way through the table
+FACET_SCAN_LIMIT = 1000
+# Below this many name prefix matches a search falls back to fuzzy matching,
+# and takes at most this many fuzzy matches
+SEARCH_CANDIDATES = 200
 
+# Arbitrary key for pg_try_advisory_xact_lock, so one worker at a time folds
+# the stats deltas and the others skip their turn
+PET_STATS_FOLD_LOCK_KEY = 7312025
+# Types and breeders per statement when refreshing their stats summaries
+PET_STATS_KEYS_BATCH = 500
+# Percentiles kept per type and breeder, by column
+PET_STATS_PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+# SQLite only: FTS5 index over pets.name (see migrations)
+pets_fts = table("pets_fts", column("rowid"))
+
+
+@timed_query
 async def add_pet(payload: PetIn, pet_id: str):
     # Convert HttpUrl to str explicitly if it exists
     payload_data = payload.model_dump(exclude={"id"})
@@ -12,13 +73,109 @@ async def add_pet(payload: PetIn, pet_id: str):
         payload_data["image_url"] = str(payload_data["image_url"])
 
     query = pets.insert().values(id=pet_id, **payload_data)
-    return await database.execute(query=query)
+    pet = await write_pet(query, "create")
+    await pet_cache.invalidate([pet_key(pet_id), breeder_key(payload.breeder_id)])
+    return pet
+
+
+@timed_query
+async def bulk_upsert_pets(rows: List[dict]) -> set:
+    """Insert or update many pets with one multi-row statement per batch.
+
+    Returns the ids that already existed, so callers can tell inserts from
+    updates. On Postgres the upsert reports that itself; on SQLite it comes
+    from a SELECT beforehand, which is best-effort: a pet created by another
+    writer in between still counts as created.
+    """
+    postgres = database.url.dialect == "postgresql"
+    insert = postgresql_insert if postgres else sqlite_insert
+    existing = set()
+    stale_keys = []
+
+    returning = list(pets.columns)
+    if postgres:
+        # xmax is 0 only in a row version the statement inserted. The subquery
+        # sees the rows as they were before it, for the breeder moved from
+        # (spelled out: SQLAlchemy does not correlate subqueries in RETURNING)
+        returning += [
+            (literal_column("xmax") == 0).label("inserted"),
+            literal_column(
+                "(SELECT before.breeder_id FROM pets AS before "
+                "WHERE before.id = pets.id)"
+            ).label("old_breeder_id"),
+        ]
+
+    async with database.transaction():
+        for start in range(0, len(rows), BULK_BATCH_SIZE):
+            batch = rows[start : start + BULK_BATCH_SIZE]
 
+            if not postgres:
+                found = await database.fetch_all(
+                    select(pets.c.id, pets.c.breeder_id).where(
+                        pets.c.id.in_([row["id"] for row in batch])
+                    )
+                )
+                found_ids = {record["id"] for record in found}
+                stale_keys += [breeder_key(record["breeder_id"]) for record in found]
+            stale_keys += [pet_key(row["id"]) for row in batch]
+            stale_keys += [breeder_key(row["breeder_id"]) for row in batch]
 
+            query = insert(pets).values(batch)
+            query = query.on_conflict_do_update(
+                index_elements=[pets.c.id],
+                set_={
+                    **{
+                        column.name: query.excluded[column.name]
+                        for column in pets.columns
+                        if column.name not in ("id", "version")
+                    },
+                    "version": pets.c.version + 1,
+                },
+            )
+            records = await database.fetch_all(query.returning(*returning))
+            if postgres:
+                found_ids = {
+                    record["id"] for record in records if not record["inserted"]
+                }
+                stale_keys += [
+                    breeder_key(record["old_breeder_id"])
+                    for record in records
+                    if record["old_breeder_id"] is not None
+                ]
+            existing.update(found_ids)
+            await record_changes(
+                [
+                    pet_change(
+                        "update" if record["id"] in found_ids else "create",
+                        record["id"],
+                        {column.name: record[column.name] for column in pets.columns},
+                    )
+                    for record in records
+                ]
+            )
+
+    change_feed.notify()
+    await pet_cache.invalidate(stale_keys)
+    return existing
+
+
+def select_pets(columns: Optional[Sequence[str]] = None):
+    """SELECT every column, or only ``columns`` plus the id and version that
+    links and ETags are built from"""
+    if columns is None:
+        return pets.select()
+    names = dict.fromkeys(("id", "version", *columns))
+    return select(*(pets.c[name] for name in names))
+
+
+@timed_query
 async def get_all_pets(
-    type: Optional[str], limit: Optional[int], offset: Optional[int]
+    type: Optional[str],
+    limit: Optional[int],
+    offset: Optional[int],
+    columns: Optional[Sequence[str]] = None,
 ):
-    query = pets.select()
+    query = select_pets(columns)
 
     if type is not None:
         query = query.where(pets.c.type == type)
@@ -32,30 +189,724 @@ async def get_all_pets(
     return await database.fetch_all(query)
 
 
+@timed_query
+async def get_pets_page(
+    type: Optional[str],
+    limit: int,
+    after: Optional[Tuple[str, str]] = None,
+    before: Optional[Tuple[str, str]] = None,
+    columns: Optional[Sequence[str]] = None,
+):
+    """Keyset pagination ordered by (type, id).
+
+    Rows strictly after ``after`` are returned in ascending order; rows
+    strictly before ``before`` are returned in descending order so the
+    caller can fetch the page preceding a cursor without an OFFSET scan.
+    """
+    # The cursor of the next/prev page is built from type and id
+    query = select_pets(None if columns is None else ("type", *columns))
+
+    if type is not None:
+        query = query.where(pets.c.type == type)
+
+    key = tuple_(pets.c.type, pets.c.id)
+    if before is not None:
+        query = query.where(key < tuple_(*before))
+        query = query.order_by(pets.c.type.desc(), pets.c.id.desc())
+    else:
+        if after is not None:
+            query = query.where(key > tuple_(*after))
+        query = query.order_by(pets.c.type, pets.c.id)
+
+    return await database.fetch_all(query.limit(limit))
+
+
+async def search_conditions(params: PetSearchParams) -> Tuple[list, tuple]:
+    """WHERE conditions and relevance order of a search.
+
+    q matches names by prefix, in name order. Only when that finds fewer than
+    SEARCH_CANDIDATES pets (on Postgres) do fuzzy matches join in, ranked by
+    similarity after the prefix ones. Those are the first SEARCH_CANDIDATES
+    the scan comes across, not the best ones: scoring every name that
+    resembles a short query would scan a large part of the table, and such a
+    query has plenty of prefix matches anyway.
+    """
+    conditions = []
+    if params.min_price is not None:
+        conditions.append(pets.c.price >= params.min_price)
+    if params.max_price is not None:
+        conditions.append(pets.c.price <= params.max_price)
+    if params.type is not None:
+        conditions.append(pets.c.type == params.type)
+    if params.breeder_id is not None:
+        conditions.append(pets.c.breeder_id == params.breeder_id)
+
+    if not params.q:
+        return conditions, (pets.c.id,)
+
+    prefix = name_prefix(params.q)
+    relevance = (name_key(), pets.c.id)
+    if database.url.dialect != "postgresql":
+        return [*conditions, prefix], relevance
+
+    # Both id lists are short here, and a plain id list keeps the planner
+    # from scanning the table for the OR of two lossy name conditions
+    query = select(pets.c.id).where(prefix, *conditions).limit(SEARCH_CANDIDATES)
+    ids = [record["id"] for record in await database.fetch_all(query)]
+    if len(ids) == SEARCH_CANDIDATES:
+        return [*conditions, prefix], relevance
+
+    query = (
+        select(pets.c.id)
+        .where(fuzzy_name(params.q), *conditions)
+        .limit(SEARCH_CANDIDATES)
+    )
+    ids += [record["id"] for record in await database.fetch_all(query)]
+    relevance = (
+        prefix.desc(),
+        func.word_similarity(params.q, pets.c.name).desc(),
+        *relevance,
+    )
+    return [pets.c.id.in_(ids)], relevance
+
+
+def name_key():
+    """Lower-cased name in byte order, as indexed by ix_pets_name_key, so that
+    name prefixes and name sorts are both range scans of that index"""
+    key = func.lower(pets.c.name)
+    if database.url.dialect == "postgresql":
+        return key.collate("C")
+    return key
+
+
+def name_prefix(q: str):
+    """Names starting with q, ignoring case"""
+    if database.url.dialect == "postgresql":
+        return name_key().like(escape_like(q.lower()) + "%", escape="\\")
+    # SQLite (tests): FTS5 prefix terms, which match the start of any word
+    matches = select(pets_fts.c.rowid).where(
+        literal_column("pets_fts").op("MATCH")(fts_prefix_query(q))
+    )
+    return literal_column("pets.rowid").in_(matches)
+
+
+def fuzzy_name(q: str):
+    # pg_trgm word similarity: q is close to part of the name, which catches
+    # misspellings (coper -> Cooper). Served by ix_pets_name_trgm
+    return literal(q).bool_op("<%")(pets.c.name)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fts_prefix_query(q: str) -> str:
+    # Every word as a quoted prefix term: bel ro -> "bel"* "ro"*
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in q.split())
+
+
+@timed_query
+async def search_pets(
+    params: PetSearchParams, limit: int
+) -> Tuple[List[dict], Optional[dict]]:
+    """One page of matches, and their facets unless params.facets is off"""
+    conditions, relevance = await search_conditions(params)
+    name = name_key()
+    order = {
+        "relevance": relevance,
+        "price": (pets.c.price, pets.c.id),
+        "-price": (pets.c.price.desc(), pets.c.id.desc()),
+        "name": (name, pets.c.id),
+        "-name": (name.desc(), pets.c.id.desc()),
+    }[params.sort]
+    query = (
+        select(pets)
+        .where(*conditions)
+        .order_by(*order)
+        .limit(limit)
+        .offset(params.offset)
+    )
+    if not params.facets:
+        return await fetch_search_page(query), None
+    # Independent queries, so each runs on its own pooled connection
+    return await asyncio.gather(
+        fetch_search_page(query), count_search_facets(conditions)
+    )
+
+
+async def fetch_search_page(query) -> List[dict]:
+    return [dict(record._mapping) for record in await database.fetch_all(query)]
+
+
+async def count_search_facets(conditions: list) -> dict:
+    """Match counts per type and per breeder, and the number of matches.
+
+    Only the first FACET_SCAN_LIMIT matches are counted; ``total_exact`` is
+    False when there were more, and ``total`` is then a lower bound.
+    """
+    matches = (
+        select(pets.c.type, pets.c.breeder_id)
+        .where(*conditions)
+        .limit(FACET_SCAN_LIMIT + 1)
+        .subquery()
+    )
+    # One scan for both facets: counts per (type, breeder_id) pair, added up
+    # per facet below
+    query = select(
+        matches.c.type, matches.c.breeder_id, func.count().label("count")
+    ).group_by(matches.c.type, matches.c.breeder_id)
+    records = await database.fetch_all(query)
+
+    counts = {"type": Counter(), "breeder_id": Counter()}
+    for record in records:
+        for facet, counter in counts.items():
+            counter[record[facet]] += record["count"]
+    total = sum(counts["type"].values())
+
+    return {
+        "total": min(total, FACET_SCAN_LIMIT),
+        "total_exact": total <= FACET_SCAN_LIMIT,
+        "facets": {
+            facet: [
+                {"value": value, "count": count}
+                for value, count in sorted(
+                    counter.items(), key=lambda item: (-item[1], item[0] or "")
+                )[:FACET_LIMIT]
+            ]
+            for facet, counter in counts.items()
+        },
+    }
+
+
+async def iterate_pets(type: Optional[str] = None):
+    """Stream every pet through a server-side cursor instead of fetch_all"""
+    query = pets.select()
+
+    if type is not None:
+        query = query.where(pets.c.type == type)
+
+    async for record in database.iterate(query):
+        yield record
+
+
 async def get_pet(id):
+    return await pet_cache.get_or_load(pet_key(id), lambda: fetch_pet(id))
+
+
+@timed_query
+async def fetch_pet(id) -> Optional[dict]:
     query = pets.select().where(pets.c.id == id)
-    return await database.fetch_one(query=query)
+    record = await database.fetch_one(query=query)
+    return dict(record._mapping) if record is not None else None
 
 
-async def update_pet(id: int, payload: PetIn):
-    # Convert HttpUrl to str explicitly if it exists
-    payload_data = payload.model_dump()
-    if payload_data.get("image_url"):
-        payload_data["image_url"] = str(payload_data["image_url"])
+async def get_pets_by_ids(ids: List[str]) -> Dict[str, dict]:
+    """Look up many pets at once, through the cache; returns them by id"""
+    ids_by_key = {pet_key(id): id for id in ids}
+
+    async def load(keys: List[str]) -> Dict[str, dict]:
+        records = await fetch_pets_by_ids([ids_by_key[key] for key in keys])
+        return {pet_key(record["id"]): record for record in records}
+
+    found = await pet_cache.get_many_or_load(list(ids_by_key), load)
+    return {ids_by_key[key]: pet for key, pet in found.items()}
+
+
+@timed_query
+async def fetch_pets_by_ids(ids: List[str]) -> List[dict]:
+    if database.url.dialect == "postgresql":
+        # One array parameter: the same prepared statement serves any batch
+        # size, where IN (...) would be a new statement per length
+        condition = pets.c.id == any_(bindparam("ids", ids, type_=ARRAY(String)))
+    else:
+        condition = pets.c.id.in_(ids)
+    records = await database.fetch_all(pets.select().where(condition))
+    return [dict(record._mapping) for record in records]
+
+
+@timed_query
+async def update_pet(
+    id: str, changes: dict, expected_version: Optional[int] = None
+) -> Optional[dict]:
+    """Write only the changed columns in one UPDATE ... RETURNING statement.
+
+    Returns the updated row, or None when nothing was written: the pet does
+    not exist or, with ``expected_version``, its version has moved on.
+    """
+    # Moving a pet to another breeder also empties a slot in the old
+    # breeder's list, the one case that needs the previous row (normally a
+    # cache hit)
+    previous = (
+        await get_pet(id) if pet_cache.enabled and "breeder_id" in changes else None
+    )
 
-    query = pets.update().where(pets.c.id == id).values(**payload_data)
-    return await database.execute(query=query)
+    query = pets.update().where(pets.c.id == id)
+    if expected_version is not None:
+        query = query.where(pets.c.version == expected_version)
+    query = query.values(**changes, version=pets.c.version + 1)
+    pet = await write_pet(query, "update")
+    if pet is None:
+        return None
 
+    await pet_cache.invalidate(stale_pet_keys(id, pet["breeder_id"], previous))
+    return pet
 
-async def delete_pet(id: int):
-    query = pets.delete().where(pets.c.id == id)
-    return await database.execute(query=query)
 
+@timed_query
+async def set_pet_images(images: dict):
+    """Fill image_url for many pets with one UPDATE ... CASE statement.
 
+    Pets whose image_url was set in the meantime are left untouched. Returns
+    the number of pets updated.
+    """
+    query = (
+        pets.update()
+        .where(pets.c.id.in_(list(images)))
+        .where(pets.c.image_url.is_(None))
+        .values(
+            image_url=case(images, value=pets.c.id), version=pets.c.version + 1
+        )
+    )
+    async with database.transaction():
+        records = await database.fetch_all(query.returning(*pets.columns))
+        await record_changes(
+            [
+                pet_change("update", record["id"], dict(record._mapping))
+                for record in records
+            ]
+        )
+
+    change_feed.notify()
+    await pet_cache.invalidate(
+        [pet_key(record["id"]) for record in records]
+        + [breeder_key(record["breeder_id"]) for record in records]
+    )
+    return len(records)
+
+
+@timed_query
+async def delete_pet(id: str) -> Optional[dict]:
+    """Delete a pet; returns its id and breeder_id, or None if there was none"""
+    query = (
+        pets.delete()
+        .where(pets.c.id == id)
+        .returning(pets.c.id, pets.c.breeder_id)
+    )
+    async with database.transaction():
+        record = await database.fetch_one(query=query)
+        if record is None:
+            return None
+        await record_changes([pet_change("delete", id)])
+
+    change_feed.notify()
+    await pet_cache.invalidate(stale_pet_keys(id, record["breeder_id"], None))
+    return dict(record._mapping)
+
+
+@timed_query
 async def delete_all_pets():
     query = pets.delete()
-    return await database.execute(query=query)
+    async with database.transaction():
+        result = await database.execute(query=query)
+        await record_changes([pet_change("delete_all", None)])
+    change_feed.notify()
+    await pet_cache.invalidate_all()
+    return result
+
+
+def pet_change(op: str, pet_id: Optional[str], pet: Optional[dict] = None) -> dict:
+    return {
+        "op": op,
+        "pet_id": pet_id,
+        "pet": json.dumps(pet) if pet is not None else None,
+    }
+
+
+async def write_pet(query, op: str) -> Optional[dict]:
+    """Run an INSERT or UPDATE of one pet and append its change to the outbox,
+    in one transaction. Returns the row as written, or None when no row was.
+    """
+    async with database.transaction():
+        record = await database.fetch_one(query=query.returning(*pets.columns))
+        if record is None:
+            return None
+        pet = dict(record._mapping)
+        await record_changes([pet_change(op, pet["id"], pet)])
+    change_feed.notify()
+    return pet
+
+
+async def record_changes(changes: List[dict]):
+    """Append to the pet_changes outbox. Call inside the write's transaction,
+    so a change becomes visible exactly when the write does"""
+    if not changes:
+        return
+    changed_at = time.time()
+    await database.execute(
+        pet_changes.insert().values(
+            [{**change, "changed_at": changed_at} for change in changes]
+        )
+    )
+    if settings.CHANGES_NOTIFY and database.url.dialect == "postgresql":
+        # Delivered on commit
+        await database.execute("NOTIFY pet_changes")
+
+
+class ChangesExpired(Exception):
+    """The changes after ``since`` have been pruned"""
+
+    def __init__(self, pruned: int):
+        super().__init__(f"Changes up to seq {pruned} have been pruned")
+        self.pruned = pruned
+
+
+@timed_query
+async def get_changes_pruned() -> int:
+    """The seq up to which changes have been pruned"""
+    return await database.fetch_val(select(pet_changes_pruned.c.seq))
+
+
+@timed_query
+async def get_changes(since: int, limit: int) -> List[dict]:
+    """Up to ``limit`` changes with a seq after ``since``, in seq order.
+
+    Sequence numbers are drawn before commit, so concurrent writers can make
+    them visible out of order. The list stops at a gap in the sequence until
+    the change after it is CHANGES_GAP_TIMEOUT old: by then the missing
+    numbers belong to rolled back writes, not ones yet to commit, and a
+    consumer continuing from the last seq returned skips nothing. since=0
+    reads from the oldest change kept, gaps included.
+
+    Raises ChangesExpired when changes after ``since`` have been pruned.
+    """
+    query = (
+        pet_changes.select()
+        .where(pet_changes.c.seq > since)
+        .order_by(pet_changes.c.seq)
+        .limit(limit)
+    )
+    settled_before = time.time() - settings.CHANGES_GAP_TIMEOUT
+    records = await database.fetch_all(query)
+    # Read after the changes, so a prune in between is caught here
+    pruned = await get_changes_pruned()
+    if 0 < since < pruned:
+        raise ChangesExpired(pruned)
+    since = max(since, pruned)
+
+    changes = []
+    expected = since + 1
+    for record in records:
+        if record["seq"] <= since:
+            continue
+        gap = record["seq"] != expected
+        if gap and record["changed_at"] > settled_before:
+            break
+        expected = record["seq"] + 1
+        changes.append(
+            {
+                "seq": record["seq"],
+                "op": record["op"],
+                "id": record["pet_id"],
+                "pet": json.loads(record["pet"]) if record["pet"] else None,
+                "changed_at": record["changed_at"],
+            }
+        )
+    return changes
+
+
+@timed_query
+async def prune_changes(before: float, limit: int = 10000) -> int:
+    """Delete up to ``limit`` of the oldest changes made before ``before`` (a
+    timestamp) and move the pruned seq past them. Returns the number deleted.
+    """
+    async with database.transaction():
+        seqs = await database.fetch_all(
+            select(pet_changes.c.seq)
+            .where(pet_changes.c.changed_at < before)
+            .order_by(pet_changes.c.seq)
+            .limit(limit)
+        )
+        if not seqs:
+            return 0
+        through = seqs[-1]["seq"]
+        await database.execute(
+            pet_changes.delete().where(pet_changes.c.seq <= through)
+        )
+        await database.execute(
+            pet_changes_pruned.update()
+            .where(pet_changes_pruned.c.seq < through)
+            .values(seq=through)
+        )
+    return len(seqs)
+
+
+@timed_query
+async def fold_pet_stats(limit: int = 20000) -> int:
+    """Fold up to ``limit`` pending price deltas into the stats buckets and
+    refresh the summary rows of the types and breeders they touched.
+
+    Returns the number of deltas folded: 0 when there were none, or when
+    another worker holds the fold.
+    """
+    async with database.transaction():
+        if database.url.dialect == "postgresql":
+            locked = await database.fetch_val(
+                select(func.pg_try_advisory_xact_lock(PET_STATS_FOLD_LOCK_KEY))
+            )
+            if not locked:
+                return 0
+
+        pending = select(pet_stat_deltas.c.seq).order_by(pet_stat_deltas.c.seq)
+        deltas = await database.fetch_all(
+            pet_stat_deltas.delete()
+            .where(pet_stat_deltas.c.seq.in_(pending.limit(limit)))
+            .returning(
+                pet_stat_deltas.c.dimension,
+                pet_stat_deltas.c.value,
+                pet_stat_deltas.c.bucket,
+                pet_stat_deltas.c.count,
+                pet_stat_deltas.c.price,
+            )
+        )
+        if not deltas:
+            return 0
+
+        buckets = {}
+        for delta in deltas:
+            key = (delta["dimension"], delta["value"], delta["bucket"])
+            bucket = buckets.setdefault(key, [0, 0.0, None, None])
+            bucket[0] += delta["count"]
+            price = delta["price"]
+            if price is None:
+                continue
+            bucket[1] += delta["count"] * price
+            if delta["count"] > 0:
+                # Removals leave the bounds be: whatever remains in the bucket
+                # is still within a bucket width of them
+                bucket[2] = price if bucket[2] is None else min(bucket[2], price)
+                bucket[3] = price if bucket[3] is None else max(bucket[3], price)
+        # In key order, so the bucket rows are always locked in the same order
+        await add_to_pet_stat_buckets(
+            [
+                dict(zip(pet_stat_buckets.columns.keys(), (*key, *totals)))
+                for key, totals in sorted(buckets.items())
+            ]
+        )
+
+        keys = sorted({(dimension, value) for dimension, value, _ in buckets})
+        for start in range(0, len(keys), PET_STATS_KEYS_BATCH):
+            await refresh_pet_stats(keys[start : start + PET_STATS_KEYS_BATCH])
+
+    return len(deltas)
+
+
+def insert_rows(table, rows: List[dict]):
+    """INSERT of ``rows``, which all have the same keys. On Postgres it takes
+    one array parameter per column, so it stays one short statement however
+    many rows there are; elsewhere, keep batches under BULK_BATCH_SIZE."""
+    if database.url.dialect != "postgresql":
+        return sqlite_insert(table).values(rows)
+    columns = list(rows[0])
+    arrays = select(
+        *(
+            func.unnest(
+                cast(
+                    bindparam(name, [row[name] for row in rows]),
+                    ARRAY(table.c[name].type),
+                )
+            ).label(name)
+            for name in columns
+        )
+    )
+    return postgresql_insert(table).from_select(columns, arrays)
+
+
+async def add_to_pet_stat_buckets(rows: List[dict]):
+    batch_size = len(rows) if database.url.dialect == "postgresql" else BULK_BATCH_SIZE
+    for start in range(0, len(rows), batch_size):
+        query = insert_rows(pet_stat_buckets, rows[start : start + batch_size])
+        excluded = query.excluded
+        query = query.on_conflict_do_update(
+            index_elements=[
+                pet_stat_buckets.c.dimension,
+                pet_stat_buckets.c.value,
+                pet_stat_buckets.c.bucket,
+            ],
+            set_={
+                "count": pet_stat_buckets.c.count + excluded["count"],
+                "price_sum": pet_stat_buckets.c.price_sum + excluded["price_sum"],
+                # Neither least() nor greatest() exists in both dialects
+                "min_price": case(
+                    (
+                        excluded["min_price"] < pet_stat_buckets.c.min_price,
+                        excluded["min_price"],
+                    ),
+                    else_=func.coalesce(
+                        pet_stat_buckets.c.min_price, excluded["min_price"]
+                    ),
+                ),
+                "max_price": case(
+                    (
+                        excluded["max_price"] > pet_stat_buckets.c.max_price,
+                        excluded["max_price"],
+                    ),
+                    else_=func.coalesce(
+                        pet_stat_buckets.c.max_price, excluded["max_price"]
+                    ),
+                ),
+            },
+        )
+        await database.execute(query)
+
+
+async def refresh_pet_stats(keys: List[Tuple[str, str]]):
+    """Rebuild the pet_stats rows of (dimension, value) ``keys`` from their
+    buckets, dropping the rows and buckets left empty"""
+    in_keys = tuple_(pet_stat_buckets.c.dimension, pet_stat_buckets.c.value).in_(keys)
+    await database.execute(
+        pet_stat_buckets.delete().where(in_keys, pet_stat_buckets.c.count <= 0)
+    )
+    records = await database.fetch_all(
+        select(pet_stat_buckets)
+        .where(in_keys)
+        .order_by(
+            pet_stat_buckets.c.dimension,
+            pet_stat_buckets.c.value,
+            pet_stat_buckets.c.bucket,
+        )
+    )
+
+    updated_at = time.time()
+    summaries = []
+    for (dimension, value), buckets in groupby(
+        records, key=lambda record: (record["dimension"], record["value"])
+    ):
+        summaries.append(
+            {
+                "dimension": dimension,
+                "value": value,
+                "updated_at": updated_at,
+                **summarize_price_buckets(list(buckets)),
+            }
+        )
+    emptied = set(keys) - {(row["dimension"], row["value"]) for row in summaries}
+
+    if emptied:
+        await database.execute(
+            pet_stats.delete().where(
+                tuple_(pet_stats.c.dimension, pet_stats.c.value).in_(sorted(emptied))
+            )
+        )
+    if summaries:
+        query = insert_rows(pet_stats, summaries)
+        query = query.on_conflict_do_update(
+            index_elements=[pet_stats.c.dimension, pet_stats.c.value],
+            set_={
+                column.name: query.excluded[column.name]
+                for column in pet_stats.columns
+                if column.name not in ("dimension", "value")
+            },
+        )
+        await database.execute(query)
+
+
+def summarize_price_buckets(buckets: list) -> dict:
+    """Count, sum, bounds and percentiles of one type's or breeder's prices
+    from its non-empty histogram buckets, in bucket order.
+
+    A percentile is read off the middle of the bucket it falls in, so it is
+    within about 1% of the exact one (exact when the bucket holds one price).
+    """
+    count = sum(bucket["count"] for bucket in buckets)
+    summary = {
+        "count": count,
+        "price_sum": sum(bucket["price_sum"] for bucket in buckets),
+        "min_price": buckets[0]["min_price"],
+        "max_price": buckets[-1]["max_price"],
+    }
+    for name, quantile in PET_STATS_PERCENTILES.items():
+        rank = max(1, math.ceil(quantile * count))
+        seen = 0
+        for bucket in buckets:
+            seen += bucket["count"]
+            if seen >= rank:
+                break
+        if bucket["bucket"] == ZERO_PRICE_BUCKET:
+            price = 0.0
+        else:
+            # Bucket i holds (gamma^(i-1), gamma^i]
+            upper = PRICE_BUCKET_GAMMA ** bucket["bucket"]
+            price = 2 * upper / (PRICE_BUCKET_GAMMA + 1)
+        low, high = bucket["min_price"], bucket["max_price"]
+        if low is not None and high is not None:
+            price = min(max(price, low), high)
+        summary[name] = round(price, 2)
+    return summary
+
+
+async def get_pet_stats(
+    dimension: str, value: Optional[str], limit: int, offset: int
+) -> List[dict]:
+    """Price statistics per type or per breeder, in value order"""
+    # Concurrent identical requests share one query. Not cached beyond that:
+    # the stats would then lag the folds by up to CACHE_TTL_SECONDS
+    return await pet_cache.flights.do(
+        stats_key(dimension, value, limit, offset),
+        lambda: fetch_pet_stats(dimension, value, limit, offset),
+    )
+
+
+@timed_query
+async def fetch_pet_stats(
+    dimension: str, value: Optional[str], limit: int, offset: int
+) -> List[dict]:
+    query = select(pet_stats).where(pet_stats.c.dimension == dimension)
+    if value is not None:
+        query = query.where(pet_stats.c.value == value)
+    query = query.order_by(pet_stats.c.value).limit(limit).offset(offset)
+
+    return [
+        {
+            "value": record["value"],
+            "count": record["count"],
+            "min": record["min_price"],
+            "max": record["max_price"],
+            "avg": round(record["price_sum"] / record["count"], 2),
+            "p50": record["p50"],
+            "p90": record["p90"],
+            "p99": record["p99"],
+            "updated_at": record["updated_at"],
+        }
+        for record in await database.fetch_all(query)
+    ]
+
+
+async def get_pets_by_breeder(
+    breeder_id: str, columns: Optional[Sequence[str]] = None
+) -> List[dict]:
+    # The cached list holds full rows, which beats a narrower query; the
+    # column list only applies when the cache is off
+    if columns is not None and not pet_cache.enabled:
+        return await fetch_pets_by_breeder(breeder_id, columns)
+    return await pet_cache.get_or_load(
+        breeder_key(breeder_id), lambda: fetch_pets_by_breeder(breeder_id)
+    )
+
+
+@timed_query
+async def fetch_pets_by_breeder(
+    breeder_id: str, columns: Optional[Sequence[str]] = None
+) -> List[dict]:
+    query = select_pets(columns).where(pets.c.breeder_id == breeder_id)
+    records = await database.fetch_all(query)
+    return [dict(record._mapping) for record in records]
+
 
-async def get_pets_by_breeder(breeder_id: str) -> List[dict]:
-    query = "SELECT * FROM pets WHERE breeder_id = :breeder_id"
-    return await database.fetch_all(query, values={"breeder_id": breeder_id})
\ No newline at end of file
+def stale_pet_keys(id, breeder_id: Optional[str], previous: Optional[dict]):
+    """Cache keys affected by a write to one pet"""
+    keys = [pet_key(id)]
+    if breeder_id is not None:
+        keys.append(breeder_key(breeder_id))
+    if previous is not None:
+        keys.append(breeder_key(previous["breeder_id"]))
+    return keys
\ No newline at end of file
@@ -0,0 +1,123 @@
+import asyncio
+from typing import List, Optional
+
+from app.api import db_manager
+from app.api.cat_api_adapter import CatAPIAdapter
+from app.api.metrics import IMAGE_ENRICHMENT_DROPPED, IMAGE_ENRICHMENT_QUEUE_DEPTH
+from app.api.middleware import logger
+from app.config import settings
+
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+
+class ImageEnrichmentQueue:
+    """Bounded in-process queue of pet ids whose image_url is filled in after
+    the pet has been created, so POST latency is not tied to the Cat API."""
+
+    def __init__(
+        self,
+        adapter: Optional[CatAPIAdapter] = None,
+        maxsize: int = 1000,
+        batch_size: int = 25,
+    ):
+        self.adapter = adapter or CatAPIAdapter()
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.rejected = 0
+        self.enriched = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def accepting(self) -> bool:
+        return self.running and not self._queue.full()
+
+    def enqueue(self, pet_id: str) -> bool:
+        """Queue a pet for enrichment; False when stopped or full (backpressure)"""
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(pet_id)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            IMAGE_ENRICHMENT_DROPPED.labels("full").inc()
+            logger.warning(f"Image enrichment queue full, pet {pet_id} keeps no image")
+            return False
+        self.enqueued += 1
+        IMAGE_ENRICHMENT_QUEUE_DEPTH.inc()
+        return True
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = DRAIN_TIMEOUT_SECONDS):
+        """Drain what is already queued, then stop the worker"""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"Image enrichment drain timed out with {self.depth} pets pending"
+            )
+            IMAGE_ENRICHMENT_DROPPED.labels("shutdown").inc(self.depth)
+            IMAGE_ENRICHMENT_QUEUE_DEPTH.dec(self.depth)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.depth,
+            "maxsize": self.maxsize,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "enriched": self.enriched,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            IMAGE_ENRICHMENT_QUEUE_DEPTH.dec(len(batch))
+            try:
+                await self._enrich(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                logger.warning(f"Image enrichment failed for {len(batch)} pets: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _enrich(self, pet_ids: List[str]):
+        # One batched Cat API call and one UPDATE per batch
+        urls = await self.adapter.retrieve_images(len(pet_ids))
+        if len(urls) < len(pet_ids) and settings.CAT_API_FALLBACK_IMAGE_URL:
+            urls += [settings.CAT_API_FALLBACK_IMAGE_URL] * (len(pet_ids) - len(urls))
+
+        images = dict(zip(pet_ids, urls))
+        if images:
+            await db_manager.set_pet_images(images)
+        self.enriched += len(images)
+        self.failed += len(pet_ids) - len(images)
+
+
+enrichment_queue = ImageEnrichmentQueue(
+    maxsize=settings.IMAGE_ENRICHMENT_QUEUE_SIZE,
+    batch_size=settings.IMAGE_ENRICHMENT_BATCH_SIZE,
+)
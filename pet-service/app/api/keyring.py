@@ -0,0 +1,116 @@
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from cryptography.hazmat.primitives.serialization import (
+    load_pem_private_key,
+    load_pem_public_key,
+)
+from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+
+class KeyRingError(Exception):
+    pass
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    public_key: Any
+    # None for retired keys that only verify tokens still in circulation
+    private_key: Any = None
+
+
+def key_algorithm(key) -> str:
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise KeyRingError(f"Unsupported key type {type(key).__name__}")
+
+
+def load_key(kid: str, pem: bytes) -> SigningKey:
+    try:
+        private_key = load_pem_private_key(pem, password=None)
+    except ValueError:
+        public_key = load_pem_public_key(pem)
+        return SigningKey(kid, key_algorithm(public_key), public_key)
+    return SigningKey(
+        kid, key_algorithm(private_key), private_key.public_key(), private_key
+    )
+
+
+class KeyRing:
+    """Keys indexed by kid: one signs new tokens, all of them verify"""
+
+    def __init__(self, keys: Dict[str, SigningKey], active_kid: str):
+        if active_kid not in keys or keys[active_kid].private_key is None:
+            raise KeyRingError(f"No private key for active kid {active_kid!r}")
+        self.keys = keys
+        self.active_kid = active_kid
+
+    @classmethod
+    def from_directory(cls, path: str, active_kid: Optional[str] = None):
+        """Load every <kid>.pem in path (private or public PEM).
+
+        Without an explicit active kid the last private key in name order
+        signs, so date-stamped file names rotate on their own.
+        """
+        keys = {
+            pem.stem: load_key(pem.stem, pem.read_bytes())
+            for pem in sorted(Path(path).glob("*.pem"))
+        }
+        if active_kid is None:
+            private = [kid for kid, key in keys.items() if key.private_key]
+            if not private:
+                raise KeyRingError(f"No private key found in {path}")
+            active_kid = private[-1]
+        return cls(keys, active_kid)
+
+    @property
+    def signing_key(self) -> SigningKey:
+        return self.keys[self.active_kid]
+
+    def sign(self, payload: dict) -> str:
+        key = self.signing_key
+        return jwt.encode(
+            payload,
+            key.private_key,
+            algorithm=key.algorithm,
+            headers={"kid": key.kid},
+        )
+
+    def verify(self, token: str) -> dict:
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = self.keys.get(kid)
+        if key is None:
+            raise jwt.InvalidTokenError(f"Unknown kid {kid!r}")
+        # Pin the algorithm to the key so a token cannot pick its own
+        return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+    def jwks(self) -> dict:
+        keys = []
+        for key in self.keys.values():
+            algorithm = RSAAlgorithm if key.algorithm == "RS256" else OKPAlgorithm
+            jwk = algorithm.to_jwk(key.public_key, as_dict=True)
+            jwk.update({"kid": key.kid, "alg": key.algorithm, "use": "sig"})
+            keys.append(jwk)
+        return {"keys": keys}
+
+
+class JWKSVerifier:
+    """Offline verification for other services, fed by our JWKS endpoint.
+
+    Keys are fetched once and kept for `lifespan` seconds; a token signed
+    with a kid we have not seen yet (a fresh rotation) forces one refetch.
+    """
+
+    def __init__(self, jwks_url: str, lifespan: int = 300, timeout: float = 5.0):
+        self.client = jwt.PyJWKClient(
+            jwks_url, cache_jwk_set=True, lifespan=lifespan, timeout=timeout
+        )
+
+    def verify(self, token: str, **options) -> dict:
+        key = self.client.get_signing_key_from_jwt(token)
+        return jwt.decode(token, key.key, algorithms=[key.algorithm_name], **options)
@@ -0,0 +1,112 @@
+import atexit
+import json
+import logging
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.config import settings
+
+correlation_id = ContextVar("correlation_id", default=None)
+
+listener: Optional[QueueListener] = None
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Stamp every record with the correlation id of the current request"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "correlation_id"):
+            record.correlation_id = correlation_id.get()
+        return True
+
+
+class LogQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() runs the full formatter on the calling thread; only
+    resolving the message arguments is needed there, since the record never
+    leaves the process.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={"http": ...} are kept"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc)
+            .isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "correlation_id": getattr(record, "correlation_id", None),
+        }
+        http = getattr(record, "http", None)
+        if http is not None:
+            entry["http"] = http
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def build_handlers() -> list:
+    stream = logging.StreamHandler(sys.stdout)
+    if settings.LOG_FORMAT == "json":
+        stream.setFormatter(JSONFormatter())
+    else:
+        stream.setFormatter(
+            logging.Formatter("%(levelname)s:%(name)s:%(message)s")
+        )
+    handlers = [stream]
+
+    if settings.LOGSTASH_HOST:
+        import logstash
+
+        handlers.append(
+            logstash.TCPLogstashHandler(
+                settings.LOGSTASH_HOST, settings.LOGSTASH_PORT, version=1
+            )
+        )
+    return handlers
+
+
+def configure_logging():
+    """Route every log record through a queue drained by a background thread.
+
+    The event loop only pays for putting the record on the queue; formatting
+    and the stdout/Logstash writes happen on the listener thread.
+    """
+    global listener
+    if listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    queue_handler = LogQueueHandler(records)
+    # Read the ContextVar on the calling side, the listener thread has none
+    queue_handler.addFilter(CorrelationIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    listener = QueueListener(records, *build_handlers(), respect_handler_level=True)
+    listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global listener
+    if listener is None:
+        return
+    listener.stop()
+    listener = None
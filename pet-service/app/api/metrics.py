@@ -0,0 +1,122 @@
+import functools
+import os
+import time
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Under gunicorn every worker writes its samples to files in
+# PROMETHEUS_MULTIPROC_DIR (set before the workers start, see
+# gunicorn.conf.py) and /metrics adds them up across workers.
+
+# Seconds; most requests and queries finish in single-digit milliseconds
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Latency of db_manager functions, including the wait for a connection",
+    ["function"],
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use",
+    "Connections checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAITING = Gauge(
+    "db_pool_acquire_waiting",
+    "Callers waiting for a pool connection",
+    multiprocess_mode="livesum",
+)
+DB_POOL_ACQUIRE_WAIT = Histogram(
+    "db_pool_acquire_wait_seconds",
+    "Time spent waiting for a pool connection",
+    buckets=LATENCY_BUCKETS,
+)
+DB_POOL_ACQUIRE_TIMEOUTS = Counter(
+    "db_pool_acquire_timeouts_total",
+    "Pool acquisitions that gave up after DB_POOL_ACQUIRE_TIMEOUT",
+)
+SINGLE_FLIGHT_MERGED = Counter(
+    "single_flight_merged_total",
+    "Lookups served by an identical load already in flight, by key kind",
+    ["kind"],
+)
+SINGLE_FLIGHT_TIMEOUTS = Counter(
+    "single_flight_timeouts_total",
+    "Lookups that gave up waiting for an in-flight load, by key kind",
+    ["kind"],
+)
+IMAGE_ENRICHMENT_QUEUE_DEPTH = Gauge(
+    "image_enrichment_queue_depth",
+    "Pets waiting in the image enrichment queue",
+    multiprocess_mode="livesum",
+)
+IMAGE_ENRICHMENT_DROPPED = Counter(
+    "image_enrichment_dropped_total",
+    "Pets left without an image: queue full, or still queued at shutdown",
+    ["reason"],
+)
+CAT_API_LATENCY = Histogram(
+    "cat_api_request_duration_seconds",
+    "Latency of Cat API calls",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+CAT_API_ERRORS = Counter(
+    "cat_api_errors_total",
+    "Failed Cat API calls by exception type",
+    ["error"],
+)
+
+
+def timed_query(func):
+    """Record the latency of a db_manager coroutine under its name"""
+    observe = DB_QUERY_LATENCY.labels(func.__name__).observe
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def metrics_registry():
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+metrics = APIRouter()
+
+
+# Plain def: FastAPI runs it in the threadpool, so reading every worker's
+# files does not block the event loop
+@metrics.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return Response(
+        generate_latest(metrics_registry()), media_type=CONTENT_TYPE_LATEST
+    )
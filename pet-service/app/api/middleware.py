@@ -1,68 +1,148 @@
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
+import random
 import time
 import uuid
-from fastapi import Request
+from typing import Dict, Optional
 from fastapi.exceptions import HTTPException
-from contextvars import ContextVar
 from app.api.auth import verify_jwt_token
+from app.api.log import correlation_id
+from app.api.metrics import REQUEST_LATENCY
+from app.config import settings
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("pet-service")
 
-correlation_id = ContextVar("correlation_id", default=None)
-
 
 def get_correlation_id() -> str:
     """Helper function to get current correlation ID"""
     return correlation_id.get()
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+# Both middlewares are plain ASGI callables rather than BaseHTTPMiddleware
+# subclasses: no extra task or memory stream per request, and streaming
+# responses pass through untouched.
+
+
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp, sample_rates: Optional[Dict[str, float]] = None):
+        self.app = app
+        rates = settings.LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+        # Longest prefix first so the most specific route wins
+        self.sample_rates = sorted(
+            rates.items(), key=lambda item: len(item[0]), reverse=True
+        )
+
+    def sample_rate(self, path: str) -> float:
+        for prefix, rate in self.sample_rates:
+            if path.startswith(prefix):
+                return rate
+        return 1.0
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Get or generate correlation ID
-        cor_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+        cor_id = Headers(scope=scope).get("X-Correlation-ID") or str(uuid.uuid4())
         correlation_id.set(cor_id)
-        request.state.correlation_id = cor_id
+        scope.setdefault("state", {})["correlation_id"] = cor_id
 
-        # Log request details with correlation ID
-        logger.info(f"[{cor_id}] Request started: {request.method} {request.url}")
-        logger.info(f"[{cor_id}] Query parameters: {request.query_params}")
+        start_time = time.perf_counter()
+        status_code = None
 
-        start_time = time.time()
+        async def send_with_correlation_id(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Add correlation ID to response headers
+                MutableHeaders(scope=message)["X-Correlation-ID"] = cor_id
+            await send(message)
 
         # Process request
-        response = await call_next(request)
+        await self.app(scope, receive, send_with_correlation_id)
 
-        # Log response details with correlation ID and timing
-        process_time = time.time() - start_time
+        # One record per request. Failures are always logged, successful
+        # requests only at their route's sample rate
+        if status_code is not None and status_code < 400:
+            rate = self.sample_rate(scope["path"])
+            if rate < 1.0 and random.random() >= rate:
+                return
+
+        process_time = time.perf_counter() - start_time
+        query = scope["query_string"].decode("latin-1")
         logger.info(
-            f"[{cor_id}] Request completed in {process_time:.4f} seconds with status code {response.status_code}"
+            "[%s] %s %s%s completed in %.4f seconds with status code %s",
+            cor_id,
+            scope["method"],
+            scope["path"],
+            f"?{query}" if query else "",
+            process_time,
+            status_code,
+            extra={
+                "http": {
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query": query,
+                    "status": status_code,
+                    "duration_ms": round(process_time * 1000, 3),
+                }
+            },
         )
 
-        # Add correlation ID to response headers
-        response.headers["X-Correlation-ID"] = cor_id
 
-        return response
+class MetricsMiddleware:
+    """Observe request latency per route template, e.g. /api/v1/pets/{id}/"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-class JWTMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, excluded_paths: list[str] = None):
-        super().__init__(app)
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router leaves the matched route in the scope; raw paths would
+            # give every pet id its own series
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status_code),
+            ).observe(time.perf_counter() - start_time)
+
+
+class JWTMiddleware:
+    def __init__(self, app: ASGIApp, excluded_paths: list[str] = None):
+        self.app = app
         self.excluded_paths = excluded_paths or []
 
-    async def dispatch(self, request: Request, call_next):
-        if request.method == "OPTIONS":
-            response = await call_next(request)
-            return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
         # Exclude paths from middleware
-        if any(request.url.path.startswith(path) for path in self.excluded_paths):
-            return await call_next(request)
+        if any(scope["path"].startswith(path) for path in self.excluded_paths):
+            await self.app(scope, receive, send)
+            return
 
         try:
             # Check for Authorization header
-            auth_header = request.headers.get("Authorization")
+            auth_header = Headers(scope=scope).get("Authorization")
             if not auth_header:
                 raise HTTPException(
                     status_code=401, detail="Authorization header is missing"
@@ -78,22 +158,47 @@ class JWTMiddleware(BaseHTTPMiddleware):
             token = auth_header.split("Bearer ")[1]
 
             # Validate the token using the custom function
-            if not verify_jwt_token(token):
+            claims = verify_jwt_token(token)
+            if not claims:
                 raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-            # Proceed to the next middleware or route handler
-            response = await call_next(request)
-            return response
+            # Hand the claims to get_current_user so it does not decode again
+            scope.setdefault("state", {})["user"] = claims
 
         except HTTPException as http_exc:
             # Handle HTTPException explicitly and return a JSON response
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=http_exc.status_code,
                 content={"detail": http_exc.detail},
             )
-        except Exception as exc:
-            # Handle unexpected exceptions and return a 500 response
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "An internal server error occurred"},
-            )
+            await response(scope, receive, send)
+            return
+        except Exception:
+            await internal_error(scope, receive, send)
+            return
+
+        # Proceed to the next middleware or route handler
+        response_started = False
+
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_tracking_start)
+        except Exception:
+            # Handle unexpected exceptions and return a 500 response, unless
+            # the response is already on its way
+            if response_started:
+                raise
+            await internal_error(scope, receive, send)
+
+
+async def internal_error(scope: Scope, receive: Receive, send: Send):
+    response = JSONResponse(
+        status_code=500,
+        content={"detail": "An internal server error occurred"},
+    )
+    await response(scope, receive, send)
@@ -0,0 +1,448 @@
+"""Versioned schema migrations, applied idempotently at startup.
+
+Each migration is recorded in ``schema_migrations`` once applied. Migrations
+are written against the schema as it was at the time, not against the current
+``metadata``, so they keep replaying correctly on an empty database. Add new
+steps to the end of ``MIGRATIONS``; never edit one that has shipped.
+
+Each migration runs in a transaction of its own, except on Postgres for the
+ones marked non-transactional: those build indexes CONCURRENTLY, so writes to
+the table carry on meanwhile, and have to be safe to re-run after failing
+part-way.
+"""
+
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, List, NamedTuple
+
+from app.api.middleware import logger
+
+# Arbitrary key for pg_advisory_lock so gunicorn workers booting
+# together apply migrations one at a time
+MIGRATION_LOCK_KEY = 7312024
+MIGRATION_LOCK_POLL_SECONDS = 0.5
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    apply: Callable[..., Awaitable[None]]
+    transactional: bool = True
+
+
+async def column_exists(database, table: str, column: str) -> bool:
+    if database.url.dialect == "sqlite":
+        rows = await database.fetch_all(f"PRAGMA table_info({table})")
+        return any(row["name"] == column for row in rows)
+    row = await database.fetch_one(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = :table AND column_name = :column",
+        values={"table": table, "column": column},
+    )
+    return row is not None
+
+
+async def create_index(database, name: str, definition: str):
+    """CREATE INDEX ``name`` ON ``definition``, concurrently on Postgres. A
+    concurrent build that failed leaves an invalid index behind, which is
+    dropped and built again."""
+    if database.url.dialect != "postgresql":
+        await database.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        return
+    valid = await database.fetch_val(
+        "SELECT i.indisvalid FROM pg_index i "
+        "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name",
+        values={"name": name},
+    )
+    if valid:
+        return
+    if valid is not None:
+        await drop_index(database, name)
+    await database.execute(f"CREATE INDEX CONCURRENTLY {name} ON {definition}")
+
+
+async def drop_index(database, name: str):
+    if database.url.dialect == "postgresql":
+        await database.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    else:
+        await database.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+async def create_pets_table(database):
+    await database.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pets (
+            id VARCHAR(36) PRIMARY KEY,
+            name VARCHAR(50),
+            type VARCHAR(50),
+            price FLOAT,
+            breeder_id VARCHAR(36),
+            image_url VARCHAR(255)
+        )
+        """
+    )
+
+
+async def add_pets_version(database):
+    if not await column_exists(database, "pets", "version"):
+        await database.execute(
+            "ALTER TABLE pets ADD COLUMN version INTEGER NOT NULL DEFAULT 1"
+        )
+
+
+async def add_pets_lookup_indexes(database):
+    # get_pets_by_breeder filters on breeder_id; type filters and keyset
+    # pagination order by (type, id)
+    await create_index(database, "ix_pets_breeder_id", "pets (breeder_id)")
+    await create_index(database, "ix_pets_type_id", "pets (type, id)")
+
+
+async def add_pets_search_indexes(database):
+    # /pets/search: ordered price ranges, and pages filtered by breeder that
+    # come out of the index in id order (which makes the old index redundant)
+    await create_index(database, "ix_pets_price_id", "pets (price, id)")
+    await create_index(database, "ix_pets_breeder_id_id", "pets (breeder_id, id)")
+    await drop_index(database, "ix_pets_breeder_id")
+
+    if database.url.dialect == "postgresql":
+        # Byte order, so LIKE 'prefix%' and name sorts are range scans
+        # whatever the database collation
+        await create_index(
+            database, "ix_pets_name_key", 'pets ((lower(name) COLLATE "C"), id)'
+        )
+        # Trigram GIN for the fuzzy (word similarity) name matches
+        await database.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        await create_index(
+            database, "ix_pets_name_trgm", "pets USING gin (name gin_trgm_ops)"
+        )
+        return
+
+    await create_index(database, "ix_pets_name_key", "pets (lower(name), id)")
+    # SQLite (tests): an FTS5 index over pets.name, kept in step by triggers
+    await database.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS pets_fts "
+        "USING fts5(name, content='pets', content_rowid='rowid')"
+    )
+    await database.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pets_fts_insert AFTER INSERT ON pets BEGIN
+            INSERT INTO pets_fts (rowid, name) VALUES (new.rowid, new.name);
+        END
+        """
+    )
+    await database.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pets_fts_delete AFTER DELETE ON pets BEGIN
+            INSERT INTO pets_fts (pets_fts, rowid, name)
+            VALUES ('delete', old.rowid, old.name);
+        END
+        """
+    )
+    await database.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS pets_fts_update AFTER UPDATE OF name ON pets
+        BEGIN
+            INSERT INTO pets_fts (pets_fts, rowid, name)
+            VALUES ('delete', old.rowid, old.name);
+            INSERT INTO pets_fts (rowid, name) VALUES (new.rowid, new.name);
+        END
+        """
+    )
+    # Index the rows that were there before the triggers
+    await database.execute("INSERT INTO pets_fts (pets_fts) VALUES ('rebuild')")
+
+
+async def create_pet_changes_table(database):
+    # Sequence numbers are never reused: AUTOINCREMENT on SQLite, even once
+    # the newest changes have been deleted
+    if database.url.dialect == "sqlite":
+        seq = "seq INTEGER PRIMARY KEY AUTOINCREMENT"
+    else:
+        seq = "seq BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+    await database.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS pet_changes (
+            {seq},
+            op VARCHAR(10) NOT NULL,
+            pet_id VARCHAR(36),
+            pet TEXT,
+            changed_at FLOAT NOT NULL
+        )
+        """
+    )
+
+
+# /pets/stats price histograms: log-scale buckets, each spanning a factor of
+# PRICE_BUCKET_GAMMA, so a price read back from its bucket is within 1%
+PRICE_BUCKET_GAMMA = 1.01 / 0.99
+# Bucket of prices of zero or less
+ZERO_PRICE_BUCKET = -1000000
+
+
+def price_bucket(price: str) -> str:
+    """SQL for the histogram bucket of the price expression ``price``"""
+    return (
+        f"CASE WHEN {price} > 0 "
+        f"THEN CAST(ceil(ln({price}) / {math.log(PRICE_BUCKET_GAMMA)!r}) AS INTEGER) "
+        f"ELSE {ZERO_PRICE_BUCKET} END"
+    )
+
+
+def stat_deltas(row: str, count: int, source: str = "", where: str = "") -> str:
+    """SELECT of the deltas a pet ``row`` makes to its type and breeder stats"""
+    return " UNION ALL ".join(
+        f"SELECT '{dimension}', {row}.{column}, {price_bucket(f'{row}.price')}, "
+        f"{count}, {row}.price {source} "
+        f"WHERE {row}.{column} IS NOT NULL AND {row}.price IS NOT NULL {where}"
+        for dimension, column in (("type", "type"), ("breeder", "breeder_id"))
+    )
+
+
+async def create_pet_stats_tables(database):
+    # Triggers on pets append to pet_stat_deltas, and a background fold (see
+    # db_manager.fold_pet_stats) moves the deltas into per-bucket counts and
+    # the summary rows /pets/stats reads. Writers only ever insert, so they
+    # never queue up behind each other on a popular type's aggregate row.
+    if database.url.dialect == "sqlite":
+        seq = "seq INTEGER PRIMARY KEY AUTOINCREMENT"
+    else:
+        seq = "seq BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY"
+    await database.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS pet_stat_deltas (
+            {seq},
+            dimension VARCHAR(10) NOT NULL,
+            value VARCHAR(50) NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            price FLOAT
+        )
+        """
+    )
+    await database.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pet_stat_buckets (
+            dimension VARCHAR(10) NOT NULL,
+            value VARCHAR(50) NOT NULL,
+            bucket INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            price_sum FLOAT NOT NULL,
+            min_price FLOAT,
+            max_price FLOAT,
+            PRIMARY KEY (dimension, value, bucket)
+        )
+        """
+    )
+    await database.execute(
+        """
+        CREATE TABLE IF NOT EXISTS pet_stats (
+            dimension VARCHAR(10) NOT NULL,
+            value VARCHAR(50) NOT NULL,
+            count INTEGER NOT NULL,
+            price_sum FLOAT NOT NULL,
+            min_price FLOAT,
+            max_price FLOAT,
+            p50 FLOAT,
+            p90 FLOAT,
+            p99 FLOAT,
+            updated_at FLOAT NOT NULL,
+            PRIMARY KEY (dimension, value)
+        )
+        """
+    )
+
+    insert_deltas = (
+        "INSERT INTO pet_stat_deltas (dimension, value, bucket, count, price) "
+    )
+    if database.url.dialect == "postgresql":
+        # Statement triggers over transition tables: one INSERT per write
+        # statement however many rows it wrote, COPY and upserts included
+        both = "FROM old_rows o JOIN new_rows n ON n.id = o.id"
+        moved = (
+            "AND (o.type, o.breeder_id, o.price) "
+            "IS DISTINCT FROM (n.type, n.breeder_id, n.price)"
+        )
+        await database.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION record_pet_stat_deltas() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    {insert_deltas}{stat_deltas("r", 1, "FROM new_rows r")};
+                ELSIF TG_OP = 'DELETE' THEN
+                    {insert_deltas}{stat_deltas("r", -1, "FROM old_rows r")};
+                ELSE
+                    {insert_deltas}
+                    {stat_deltas("o", -1, both, moved)} UNION ALL
+                    {stat_deltas("n", 1, both, moved)};
+                END IF;
+                RETURN NULL;
+            END
+            $$
+            """
+        )
+        # Transition tables allow only one event per trigger
+        for event, tables in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            await database.execute(
+                f"DROP TRIGGER IF EXISTS pets_stats_{event.lower()} ON pets"
+            )
+            await database.execute(
+                f"""
+                CREATE TRIGGER pets_stats_{event.lower()} AFTER {event} ON pets
+                REFERENCING {tables} FOR EACH STATEMENT
+                EXECUTE FUNCTION record_pet_stat_deltas()
+                """
+            )
+    else:
+        await database.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS pets_stats_insert AFTER INSERT ON pets
+            BEGIN
+                {insert_deltas}{stat_deltas("new", 1)};
+            END
+            """
+        )
+        await database.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS pets_stats_delete AFTER DELETE ON pets
+            BEGIN
+                {insert_deltas}{stat_deltas("old", -1)};
+            END
+            """
+        )
+        await database.execute(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS pets_stats_update
+            AFTER UPDATE OF type, breeder_id, price ON pets
+            WHEN old.type IS NOT new.type OR old.breeder_id IS NOT new.breeder_id
+                OR old.price IS NOT new.price
+            BEGIN
+                {insert_deltas}
+                {stat_deltas("old", -1)} UNION ALL {stat_deltas("new", 1)};
+            END
+            """
+        )
+
+    # The pets already there: straight into the buckets, plus an empty delta
+    # per type and breeder so the first fold builds their summary rows
+    for dimension, column in (("type", "type"), ("breeder", "breeder_id")):
+        bucket = price_bucket("price")
+        await database.execute(
+            f"""
+            INSERT INTO pet_stat_buckets
+                (dimension, value, bucket, count, price_sum, min_price, max_price)
+            SELECT '{dimension}', {column}, {bucket}, count(*), sum(price),
+                min(price), max(price)
+            FROM pets WHERE {column} IS NOT NULL AND price IS NOT NULL
+            GROUP BY {column}, {bucket}
+            """
+        )
+        await database.execute(
+            f"""
+            {insert_deltas}
+            SELECT DISTINCT
+                dimension, value, {ZERO_PRICE_BUCKET}, 0, CAST(NULL AS FLOAT)
+            FROM pet_stat_buckets WHERE dimension = '{dimension}'
+            """
+        )
+
+
+async def create_pet_changes_pruned_table(database):
+    await database.execute(
+        "CREATE TABLE IF NOT EXISTS pet_changes_pruned (seq BIGINT NOT NULL)"
+    )
+    await database.execute(
+        "INSERT INTO pet_changes_pruned (seq) "
+        "SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM pet_changes_pruned)"
+    )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create pets table", create_pets_table),
+    Migration(2, "add pets.version", add_pets_version),
+    Migration(
+        3,
+        "index pets by breeder_id, (type, id)",
+        add_pets_lookup_indexes,
+        transactional=False,
+    ),
+    Migration(
+        4,
+        "search indexes on pets name, price, breeder_id",
+        add_pets_search_indexes,
+        transactional=False,
+    ),
+    Migration(5, "create pet_changes outbox", create_pet_changes_table),
+    Migration(6, "pet_stats aggregates kept up by triggers", create_pet_stats_tables),
+    Migration(7, "pet_changes retention horizon", create_pet_changes_pruned_table),
+]
+
+
+async def apply_migrations(database) -> List[int]:
+    """Apply pending migrations in order; returns their versions"""
+    postgres = database.url.dialect == "postgresql"
+    applied_now = []
+
+    # One connection throughout, as the lock and the timeout are per session
+    async with database.connection():
+        if postgres:
+            # Index builds and backfills may outlast DB_STATEMENT_TIMEOUT_MS
+            await database.execute("SET statement_timeout = 0")
+            # Polled: a worker blocked in pg_advisory_lock would hold a snapshot
+            # that the lock holder's concurrent index build waits out, deadlocking
+            while not await database.fetch_val(
+                "SELECT pg_try_advisory_lock(:key)", values={"key": MIGRATION_LOCK_KEY}
+            ):
+                await asyncio.sleep(MIGRATION_LOCK_POLL_SECONDS)
+        try:
+            await database.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at FLOAT NOT NULL
+                )
+                """
+            )
+            rows = await database.fetch_all("SELECT version FROM schema_migrations")
+            applied = {row["version"] for row in rows}
+
+            for migration in MIGRATIONS:
+                if migration.version in applied:
+                    continue
+                logger.info(
+                    f"Applying migration {migration.version}: {migration.description}"
+                )
+                if postgres and not migration.transactional:
+                    await apply_migration(database, migration)
+                else:
+                    async with database.transaction():
+                        await apply_migration(database, migration)
+                applied_now.append(migration.version)
+        finally:
+            if postgres:
+                await database.execute(
+                    "SELECT pg_advisory_unlock(:key)",
+                    values={"key": MIGRATION_LOCK_KEY},
+                )
+                await database.execute("RESET statement_timeout")
+
+    return applied_now
+
+
+async def apply_migration(database, migration: Migration):
+    await migration.apply(database)
+    await database.execute(
+        "INSERT INTO schema_migrations (version, description, applied_at) "
+        "VALUES (:version, :description, :applied_at)",
+        values={
+            "version": migration.version,
+            "description": migration.description,
+            "applied_at": time.time(),
+        },
+    )
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Optional, List, Literal
 from pydantic import BaseModel, HttpUrl  # Import HttpUrl for URL validation
 
 
@@ -33,8 +33,95 @@ class PetFilterParams(BaseModel):
     limit: Optional[int] = None
     offset: Optional[int] = None
     type: Optional[str] = None
+    cursor: Optional[str] = None  # Opaque keyset cursor from a next/prev link
+    # "cursor" starts keyset paging, in (type, id) order, from the first page
+    paginate: Literal["offset", "cursor"] = "offset"
+    fields: Optional[str] = None  # Comma-separated subset of columns to return
+    links: bool = True  # Per-pet self/collection links
 
 
 class PetListResponse(BaseModel):
     data: List[PetOut]
     links: Optional[List[Link]] = None
+
+
+class PetBulkResult(BaseModel):
+    id: str
+    status: str  # "created" or "updated"
+    links: Optional[List[Link]] = None
+
+
+class PetBulkResponse(BaseModel):
+    data: List[PetBulkResult]
+
+
+class PetBatchGetRequest(BaseModel):
+    ids: List[str]
+
+
+class PetBatchGetResponse(BaseModel):
+    data: List[PetOut]  # In request order, each id once
+    missing: List[str]  # Requested ids with no pet
+
+
+class PetSearchParams(BaseModel):
+    q: Optional[str] = None  # Name prefix, or a fuzzy match on Postgres
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    type: Optional[str] = None
+    breeder_id: Optional[str] = None
+    sort: Literal["relevance", "price", "-price", "name", "-name"] = "relevance"
+    limit: int = 20
+    offset: int = 0
+    facets: bool = True  # Include type and breeder_id counts
+
+
+class FacetCount(BaseModel):
+    value: Optional[str]
+    count: int
+
+
+class PetSearchFacets(BaseModel):
+    type: List[FacetCount]
+    breeder_id: List[FacetCount]
+
+
+class PetSearchResponse(BaseModel):
+    data: List[PetOut]
+    total: Optional[int] = None  # Number of matches, reported with facets
+    total_exact: Optional[bool] = None  # False: more matches than counted
+    facets: Optional[PetSearchFacets] = None
+    links: Optional[List[Link]] = None
+
+
+class PetChange(BaseModel):
+    seq: int
+    op: Literal["create", "update", "delete", "delete_all"]
+    id: Optional[str] = None  # None for delete_all
+    pet: Optional[dict] = None  # The row as written; None for deletes
+    changed_at: float
+
+
+class PetChangesResponse(BaseModel):
+    data: List[PetChange]
+    next: int  # Pass as ?since= to continue after these changes
+    links: Optional[List[Link]] = None
+
+
+class PetStats(BaseModel):
+    value: str  # The type or breeder_id
+    count: int  # Pets with a price
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: float
+    # Percentiles are within about 1% of the exact price
+    p50: float
+    p90: float
+    p99: float
+    updated_at: float  # Folds land every PET_STATS_FOLD_INTERVAL seconds
+
+
+class PetStatsResponse(BaseModel):
+    by: Literal["type", "breeder"]
+    data: List[PetStats]
+    links: Optional[List[Link]] = None
@@ -0,0 +1,23 @@
+from fastapi import APIRouter
+
+from app.api.cache import pet_cache
+from app.api.change_pruner import change_pruner
+from app.api.changes import change_feed
+from app.api.db import pool_stats
+from app.api.image_enrichment import enrichment_queue
+from app.api.pet_stats import pet_stats_folder
+
+ops = APIRouter()
+
+
+@ops.get("/stats")
+async def get_stats():
+    """Internal counters of the in-process background machinery"""
+    return {
+        "image_enrichment": enrichment_queue.stats(),
+        "cache": pet_cache.stats(),
+        "change_feed": change_feed.stats(),
+        "change_pruner": change_pruner.stats(),
+        "pet_stats": pet_stats_folder.stats(),
+        "db_pool": pool_stats(),
+    }
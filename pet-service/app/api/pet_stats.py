@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.api import db_manager
+from app.api.middleware import logger
+from app.config import settings
+
+
+class PetStatsFolder:
+    """Folds the price deltas that pet writes leave behind into the /pets/stats
+    aggregates, every ``interval`` seconds.
+
+    A fold that takes a full batch is followed straight away by the next, so a
+    bulk load is caught up on without waiting out the interval each time.
+    Every worker runs one; on Postgres only one of them folds at a time.
+    """
+
+    def __init__(self, interval: float = 1.0, batch_size: int = 20000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.folds = 0
+        self.folded = 0
+        self.failed = 0
+        self.last_fold_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "folds": self.folds,
+            "folded": self.folded,
+            "failed": self.failed,
+            "last_fold_ms": round(self.last_fold_ms, 3),
+        }
+
+    async def _run(self):
+        while True:
+            try:
+                folded = await self.fold()
+            except Exception as e:
+                self.failed += 1
+                folded = 0
+                logger.warning(f"Folding pet stats failed: {e}")
+            if folded < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    async def fold(self) -> int:
+        start = time.perf_counter()
+        folded = await db_manager.fold_pet_stats(self.batch_size)
+        if folded:
+            self.folds += 1
+            self.folded += folded
+            self.last_fold_ms = (time.perf_counter() - start) * 1000
+        return folded
+
+
+pet_stats_folder = PetStatsFolder(
+    interval=settings.PET_STATS_FOLD_INTERVAL,
+    batch_size=settings.PET_STATS_FOLD_BATCH,
+)
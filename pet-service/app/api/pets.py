@@ -1,5 +1,6 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, Response, Depends
+from typing import List, Literal, Optional, Tuple
+from fastapi import APIRouter, HTTPException, Request, Response, Depends
+from fastapi.responses import ORJSONResponse, StreamingResponse
 
 from app.api.models import (
     PetOut,
@@ -8,17 +9,50 @@ from app.api.models import (
     PetListResponse,
     PetFilterParams,
     PetUpdate,
+    PetBulkResult,
+    PetBulkResponse,
+    PetBatchGetRequest,
+    PetBatchGetResponse,
+    PetSearchParams,
+    PetSearchResponse,
+    PetChangesResponse,
+    PetStatsResponse,
 )
 from app.api.cat_api_adapter import CatAPIAdapter
+from app.api.image_enrichment import enrichment_queue
+from app.api.changes import change_feed
 from app.api import db_manager
 from app.api.middleware import logger
+import base64
+import hashlib
+import json
+import time
+from collections import Counter
 import uuid
 import os
+from urllib.parse import urlencode
 
 # from app.api.service import is_cast_present
 
 pets = APIRouter()
 URL_PREFIX = os.getenv("URL_PREFIX")
+DEFAULT_PAGE_LIMIT = 20
+MAX_BULK_ITEMS = 10000
+MAX_BATCH_GET_IDS = 1000
+MAX_SEARCH_LIMIT = 100
+EXPORT_CHUNK_ROWS = 500
+MAX_CHANGES_LIMIT = 1000
+# Longest a long-poll is held open, and the default length of an event stream
+MAX_CHANGES_WAIT = 300.0
+CHANGES_HEARTBEAT_SECONDS = 15.0
+CHANGES_EXPIRED = "Changes since then have been pruned; resync from /pets/"
+MAX_STATS_LIMIT = 1000
+EXPORT_COLUMNS = ("id", "name", "type", "price", "breeder_id", "image_url")
+PET_ETAG_COLUMNS = ("id", "name", "type", "price", "breeder_id", "image_url")
+# Columns that an update may not set to null
+REQUIRED_PET_FIELDS = ("name", "type", "price", "breeder_id")
+# Columns a caller may pick with ?fields=
+PET_FIELDS = ("id", "name", "type", "price", "breeder_id", "image_url")
 
 
 @pets.post("/", response_model=PetOut, status_code=201)
@@ -28,7 +62,11 @@ async def create_pet(payload: PetIn, response: Response):
     #         raise HTTPException(status_code=404, detail=f"Cast with given id:{cast_id} not found")
     pet_id = payload.id if payload.id else str(uuid.uuid4())
 
-    if payload.image_url is None:
+    # Opt-in: insert with image_url = NULL and let the background worker
+    # fill it in, unless the queue is stopped or full
+    enrich_later = payload.image_url is None and enrichment_queue.accepting()
+
+    if payload.image_url is None and not enrich_later:
         # Retrieve a random cat image from the Cat API
         cat_api_adapter = CatAPIAdapter()
 
@@ -40,6 +78,9 @@ async def create_pet(payload: PetIn, response: Response):
             pass
     await db_manager.add_pet(payload, pet_id=pet_id)
 
+    if enrich_later:
+        enrichment_queue.enqueue(pet_id)
+
     pet_url = generate_pet_url(pet_id=pet_id)
     response.headers["Location"] = pet_url
 
@@ -60,27 +101,95 @@ async def create_pet(payload: PetIn, response: Response):
     return response_data
 
 
-@pets.get("/", response_model=PetListResponse)
-async def get_pets(params: PetFilterParams = Depends()):
-    db_records = await db_manager.get_all_pets(
-        limit=params.limit, offset=params.offset, type=params.type
+@pets.post("/bulk", response_model=PetBulkResponse)
+async def bulk_upsert_pets(payload: List[PetIn]):
+    # Bulk writes skip the Cat API lookup; callers are expected to send
+    # image_url themselves (e.g. the nightly breeder sync)
+    if len(payload) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BULK_ITEMS} pets can be written per request",
+        )
+
+    rows = []
+    for pet in payload:
+        row = pet.model_dump()
+        row["id"] = pet.id if pet.id else str(uuid.uuid4())
+        rows.append(row)
+
+    ids = [row["id"] for row in rows]
+    duplicates = sorted(pet_id for pet_id, n in Counter(ids).items() if n > 1)
+    if duplicates:
+        raise HTTPException(
+            status_code=422, detail={"message": "Duplicate pet ids", "ids": duplicates}
+        )
+
+    existing = await db_manager.bulk_upsert_pets(rows)
+
+    return PetBulkResponse(
+        data=[
+            PetBulkResult(
+                id=pet_id,
+                status="updated" if pet_id in existing else "created",
+                links=[Link(rel="self", href=generate_pet_url(pet_id=pet_id))],
+            )
+            for pet_id in ids
+        ]
     )
 
-    pets = [
-        PetOut(
-            id=record["id"],
-            name=record["name"],
-            type=record["type"],
-            price=record["price"],
-            breeder_id=record["breeder_id"],
-            image_url=record["image_url"],  # Include image_url from the database
-            links=[
-                Link(rel="self", href=f"{URL_PREFIX}/pets/{record['id']}/"),
-                Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
-            ],
+
+@pets.post("/batch-get", response_model=PetBatchGetResponse)
+async def batch_get_pets(payload: PetBatchGetRequest):
+    """Resolve many pets in one request and one query (cache misses only)"""
+    if len(payload.ids) > MAX_BATCH_GET_IDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {MAX_BATCH_GET_IDS} pets can be fetched per request",
         )
-        for record in db_records
-    ]
+
+    ids = list(dict.fromkeys(payload.ids))
+    found = await db_manager.get_pets_by_ids(ids) if ids else {}
+
+    return ORJSONResponse(
+        {
+            "data": [pet_json(found[pet_id]) for pet_id in ids if pet_id in found],
+            "missing": [pet_id for pet_id in ids if pet_id not in found],
+        }
+    )
+
+
+@pets.get("/", response_model=PetListResponse)
+async def get_pets(request: Request, params: PetFilterParams = Depends()):
+    fields = parse_fields(params.fields)
+
+    # Cursor mode: a cursor from a next/prev link, or ?paginate=cursor for the
+    # first page; limit/offset otherwise
+    if params.cursor is not None or params.paginate == "cursor":
+        db_records, links = await get_pets_by_cursor(params, fields)
+    else:
+        db_records, links = await get_pets_by_offset(params, fields)
+
+    # Answer polling clients before serializing anything
+    etag = list_etag(db_records, fields, params.links)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag)
+
+    return ORJSONResponse(
+        {
+            "data": [
+                pet_json(record, links=params.links, fields=fields)
+                for record in db_records
+            ],
+            "links": [link.model_dump() for link in links],
+        },
+        headers={"ETag": etag},
+    )
+
+
+async def get_pets_by_offset(params: PetFilterParams, fields):
+    db_records = await db_manager.get_all_pets(
+        limit=params.limit, offset=params.offset, type=params.type, columns=fields
+    )
 
     # Add Link headers to paginate and return a collection link in response
     links = [
@@ -89,77 +198,319 @@ async def get_pets(params: PetFilterParams = Depends()):
     ]
 
     if params.limit:
-        next_offset = params.offset + params.limit
-        links.append(
-            Link(
-                rel="next",
-                href=f"{URL_PREFIX}/pets/?limit={params.limit}&offset={next_offset}",
+        next_offset = (params.offset or 0) + params.limit
+        query = {"limit": params.limit, "offset": next_offset, **shape_query(params)}
+        links.append(Link(rel="next", href=f"{URL_PREFIX}/pets/?{urlencode(query)}"))
+
+    return db_records, links
+
+
+async def get_pets_by_cursor(params: PetFilterParams, fields):
+    limit = params.limit or DEFAULT_PAGE_LIMIT
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    direction, key = decode_cursor(params.cursor) if params.cursor else ("next", None)
+
+    # Fetch one extra row to learn whether another page exists
+    if direction == "prev":
+        db_records = await db_manager.get_pets_page(
+            type=params.type, limit=limit + 1, before=key, columns=fields
+        )
+        has_more = len(db_records) > limit
+        db_records = list(reversed(db_records[:limit]))
+        has_prev, has_next = has_more, True
+    else:
+        db_records = await db_manager.get_pets_page(
+            type=params.type, limit=limit + 1, after=key, columns=fields
+        )
+        has_more = len(db_records) > limit
+        db_records = db_records[:limit]
+        has_prev, has_next = key is not None, has_more
+
+    links = [
+        Link(rel="self", href=f"{URL_PREFIX}/pets/"),
+        Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
+    ]
+
+    if db_records:
+        if has_next:
+            links.append(
+                Link(
+                    rel="next",
+                    href=generate_page_url(limit, params, "next", db_records[-1]),
+                )
+            )
+        if has_prev:
+            links.append(
+                Link(
+                    rel="prev",
+                    href=generate_page_url(limit, params, "prev", db_records[0]),
+                )
             )
+
+    return db_records, links
+
+
+@pets.get("/export")
+async def export_pets(
+    format: Literal["ndjson", "json"] = "ndjson", type: Optional[str] = None
+):
+    """Stream the whole catalogue without materializing it in memory"""
+    media_type = "application/x-ndjson" if format == "ndjson" else "application/json"
+    return StreamingResponse(
+        generate_export(format, type),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="pets.{format}"'},
+    )
+
+
+@pets.get("/search", response_model=PetSearchResponse)
+async def search_pets(params: PetSearchParams = Depends()):
+    """Name, price, type and breeder search with facet counts"""
+    if not 1 <= params.limit <= MAX_SEARCH_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_SEARCH_LIMIT}"
         )
+    if params.offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+    if (
+        params.min_price is not None
+        and params.max_price is not None
+        and params.min_price > params.max_price
+    ):
+        raise HTTPException(
+            status_code=400, detail="min_price must not exceed max_price"
+        )
+    params.q = params.q.strip() if params.q else None
+
+    # One extra row tells whether there is a next page
+    records, counts = await db_manager.search_pets(params, limit=params.limit + 1)
+    body = {
+        "data": [pet_json(record) for record in records[: params.limit]],
+        "total": None,
+        "total_exact": None,
+        "facets": None,
+    }
+    if counts is not None:
+        body.update(counts)
 
-    return PetListResponse(
-        data=pets,
-        links=links,
+    links = [
+        {"rel": "self", "href": f"{URL_PREFIX}/pets/search"},
+        {"rel": "collection", "href": f"{URL_PREFIX}/pets/"},
+    ]
+    if len(records) > params.limit:
+        links.append({"rel": "next", "href": generate_search_url(params)})
+    body["links"] = links
+
+    return ORJSONResponse(body)
+
+
+@pets.get("/changes", response_model=PetChangesResponse)
+async def get_changes(
+    request: Request,
+    since: Optional[int] = None,
+    limit: int = 100,
+    wait: Optional[float] = None,
+):
+    """Pet writes in order, for consumers keeping a replica.
+
+    Long-poll: returns the changes after ``since`` as soon as there are any,
+    waiting up to ``wait`` seconds (default: none) for them. With
+    ``Accept: text/event-stream`` the changes are streamed as Server-Sent
+    Events for ``wait`` seconds (default MAX_CHANGES_WAIT), resuming from
+    Last-Event-ID on reconnect. A ``since`` older than the retained changes
+    (CHANGES_RETENTION_SECONDS) gets 410 Gone.
+    """
+    streaming = "text/event-stream" in request.headers.get("Accept", "")
+    if since is None and streaming:
+        last_event_id = request.headers.get("Last-Event-ID", "0")
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+        since = int(last_event_id)
+    since = since or 0
+    if since < 0:
+        raise HTTPException(status_code=400, detail="since must not be negative")
+    if not 1 <= limit <= MAX_CHANGES_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_CHANGES_LIMIT}"
+        )
+    if wait is None:
+        wait = MAX_CHANGES_WAIT if streaming else 0.0
+    if not 0 <= wait <= MAX_CHANGES_WAIT:
+        raise HTTPException(
+            status_code=400, detail=f"wait must be between 0 and {MAX_CHANGES_WAIT}"
+        )
+
+    if since and since < await db_manager.get_changes_pruned():
+        raise HTTPException(status_code=410, detail=CHANGES_EXPIRED)
+
+    if streaming:
+        return StreamingResponse(
+            stream_changes(request, since, limit, wait),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    try:
+        changes = await change_feed.wait(
+            lambda: db_manager.get_changes(since, limit), wait
+        )
+    except db_manager.ChangesExpired:
+        raise HTTPException(status_code=410, detail=CHANGES_EXPIRED)
+    next_seq = changes[-1]["seq"] if changes else since
+    return ORJSONResponse(
+        {
+            "data": changes,
+            "next": next_seq,
+            "links": [
+                {"rel": "self", "href": f"{URL_PREFIX}/pets/changes?since={since}"},
+                {"rel": "next", "href": f"{URL_PREFIX}/pets/changes?since={next_seq}"},
+            ],
+        }
     )
 
 
+async def stream_changes(request: Request, since: int, limit: int, wait: float):
+    """One event per change, with its seq as the event id; a comment line
+    keeps idle connections open"""
+    deadline = time.monotonic() + wait
+    yield "retry: 1000\n\n"
+    while not await request.is_disconnected():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        try:
+            changes = await change_feed.wait(
+                lambda: db_manager.get_changes(since, limit),
+                min(remaining, CHANGES_HEARTBEAT_SECONDS),
+            )
+        except db_manager.ChangesExpired:
+            # Reconnecting from Last-Event-ID gets the 410
+            return
+        if not changes:
+            yield ": keep-alive\n\n"
+            continue
+        yield "".join(
+            f"id: {change['seq']}\ndata: {json.dumps(change)}\n\n"
+            for change in changes
+        )
+        since = changes[-1]["seq"]
+
+
+@pets.get("/stats", response_model=PetStatsResponse)
+async def get_pet_stats(
+    by: Literal["type", "breeder"] = "type",
+    value: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+):
+    """Price count, min, max, average and percentiles per type or per breeder.
+
+    Read from aggregates kept up to date as pets are written, so the cost
+    does not grow with the catalogue; writes show up within
+    PET_STATS_FOLD_INTERVAL seconds.
+    """
+    if not 1 <= limit <= MAX_STATS_LIMIT:
+        raise HTTPException(
+            status_code=400, detail=f"limit must be between 1 and {MAX_STATS_LIMIT}"
+        )
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+
+    stats = await db_manager.get_pet_stats(by, value, limit, offset)
+    query = {"by": by, "limit": limit}
+    if value is not None:
+        query["value"] = value
+    links = [
+        {
+            "rel": "self",
+            "href": f"{URL_PREFIX}/pets/stats?{urlencode({**query, 'offset': offset})}",
+        }
+    ]
+    if len(stats) == limit:
+        links.append(
+            {
+                "rel": "next",
+                "href": f"{URL_PREFIX}/pets/stats?"
+                f"{urlencode({**query, 'offset': offset + limit})}",
+            }
+        )
+    return ORJSONResponse({"by": by, "data": stats, "links": links})
+
+
 @pets.get("/{id}/", response_model=PetOut)
-async def get_pet(id: str):
+async def get_pet(id: str, request: Request):
     pet = await db_manager.get_pet(id)
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
+    etag = pet_etag(pet)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag)
+
     # Include link to self and collection in the response
-    response_data = PetOut(
-        id=pet["id"],
-        name=pet["name"],
-        type=pet["type"],
-        price=pet["price"],
-        breeder_id=pet["breeder_id"],
-        image_url=pet["image_url"],  # Include image_url from the database
-        links=[
-            Link(rel="self", href=f"{URL_PREFIX}/pets/{id}/"),
-            Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
-        ],
-    )
-    return response_data
+    return ORJSONResponse(pet_json(pet), headers={"ETag": etag})
 
 
 @pets.put("/{id}/", response_model=PetOut)
-async def update_pet(id: str, payload: PetUpdate):
-    pet = await db_manager.get_pet(id)
-    if not pet:
-        raise HTTPException(status_code=404, detail="Pet not found")
+async def update_pet(id: str, payload: PetUpdate, request: Request):
+    # PUT has always taken partial bodies; it stays as lenient as PATCH
+    return await write_pet_changes(id, payload, request)
+
 
-    update_data = payload.model_dump(exclude_unset=True)
-    pet_in_db = PetIn(**pet)
-    updated_pet = pet_in_db.model_copy(update=update_data)
+@pets.patch("/{id}/", response_model=PetOut)
+async def patch_pet(id: str, payload: PetUpdate, request: Request):
+    """Merge patch: only the fields present in the body are written"""
+    return await write_pet_changes(id, payload, request)
 
-    await db_manager.update_pet(id, updated_pet)
-    updated_pet_in_db = await db_manager.get_pet(id)
+
+async def write_pet_changes(id: str, payload: PetUpdate, request: Request):
+    changes = payload.model_dump(exclude_unset=True)
+    # Convert HttpUrl to str explicitly if it exists
+    if changes.get("image_url") is not None:
+        changes["image_url"] = str(changes["image_url"])
+    cleared = [field for field in REQUIRED_PET_FIELDS if field in changes]
+    cleared = [field for field in cleared if changes[field] is None]
+    if cleared:
+        raise HTTPException(
+            status_code=422,
+            detail={"message": "Fields cannot be null", "fields": cleared},
+        )
+
+    # Optimistic concurrency: the version behind a matching ETag is checked
+    # again in the UPDATE itself so a concurrent write cannot slip in between.
+    # The ETag also covers the content, so conditional writes still read first
+    pet = None
+    expected_version = None
+    if_match = request.headers.get("If-Match")
+    if if_match is not None or not changes:
+        pet = await db_manager.get_pet(id)
+        if not pet:
+            raise HTTPException(status_code=404, detail="Pet not found")
+        if if_match is not None:
+            if not etag_matches(if_match, pet_etag(pet), weak=False):
+                raise HTTPException(status_code=412, detail="Pet has been modified")
+            expected_version = pet["version"]
+
+    if changes:
+        # A missing pet shows up as no row written
+        pet = await db_manager.update_pet(
+            id, changes, expected_version=expected_version
+        )
+        if pet is None and expected_version is not None:
+            raise HTTPException(status_code=412, detail="Pet has been modified")
+        if pet is None:
+            raise HTTPException(status_code=404, detail="Pet not found")
 
     # Include updated response with link sections
-    response_data = PetOut(
-        id=updated_pet_in_db["id"],
-        name=updated_pet_in_db["name"],
-        type=updated_pet_in_db["type"],
-        price=updated_pet_in_db["price"],
-        breeder_id=updated_pet_in_db["breeder_id"],
-        image_url=updated_pet_in_db["image_url"],  # Include image_url
-        links=[
-            Link(rel="self", href=f"{URL_PREFIX}/pets/{id}/"),
-            Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
-        ],
-    )
-    return response_data
+    return ORJSONResponse(pet_json(pet), headers={"ETag": pet_etag(pet)})
 
 
 @pets.delete("/{id}/", response_model=None, status_code=200)
 async def delete_pets(id: str):
-    pet = await db_manager.get_pet(id)
-    if not pet:
+    if await db_manager.delete_pet(id) is None:
         raise HTTPException(status_code=404, detail="Pet not found")
-    return await db_manager.delete_pet(id)
 
 
 @pets.delete("/delete/all/", response_model=None, status_code=200)
@@ -175,24 +526,21 @@ async def delete_all_pets():
 
 # get pets by breeder_id
 @pets.get("/breeder/{breeder_id}/", response_model=List[PetOut])
-async def get_pets_by_breeder(breeder_id: str):
-    pets = await db_manager.get_pets_by_breeder(breeder_id)
-    if not pets:
-        return []
-
-    # Include links for each pet in the response
-    response_data = [
-        PetOut(
-            id=pet["id"],
-            name=pet["name"],
-            type=pet["type"],
-            price=pet["price"],
-            breeder_id=pet["breeder_id"],
-            image_url=pet["image_url"],  # Include image_url from the database
-        )
-        for pet in pets
-    ]
-    return response_data
+async def get_pets_by_breeder(
+    breeder_id: str, request: Request, fields: Optional[str] = None
+):
+    columns = parse_fields(fields)
+    pets = await db_manager.get_pets_by_breeder(breeder_id, columns=columns)
+
+    etag = list_etag(pets, columns)
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return not_modified(etag)
+
+    # This listing has never carried per-pet links
+    return ORJSONResponse(
+        [pet_json(pet, links=False, fields=columns) for pet in pets],
+        headers={"ETag": etag},
+    )
 
 
 #### Helper functions
@@ -200,3 +548,170 @@ async def get_pets_by_breeder(breeder_id: str):
 
 def generate_pet_url(pet_id: str):
     return f"{URL_PREFIX}/pets/{pet_id}/"
+
+
+def pet_json(record, links: bool = True, fields: Optional[Tuple[str, ...]] = None):
+    """PetOut as a plain dict, serialized by ORJSONResponse as is.
+
+    Rows come straight from the pets table, so there is nothing for
+    response_model to validate; building PetOut and Link models for every
+    row was most of the cost of a large page. Keys are in PetOut field order
+    so the JSON is byte for byte what the model path produced.
+
+    With ``fields`` only those keys are returned (plus "links" if wanted)
+    instead of the full PetOut shape.
+    """
+    if fields is not None:
+        pet = {field: record[field] for field in fields}
+        if "price" in pet:
+            pet["price"] = float(pet["price"])
+        if links:
+            pet["links"] = pet_links(record["id"])
+        return pet
+
+    return {
+        "id": record["id"],
+        "name": record["name"],
+        "type": record["type"],
+        "price": float(record["price"]),
+        "breeder_id": record["breeder_id"],
+        "image_url": record["image_url"],  # Include image_url from the database
+        "links": pet_links(record["id"]) if links else None,
+    }
+
+
+def pet_links(pet_id: str) -> List[dict]:
+    return [
+        {"rel": "self", "href": f"{URL_PREFIX}/pets/{pet_id}/"},
+        {"rel": "collection", "href": f"{URL_PREFIX}/pets/"},
+    ]
+
+
+def encode_cursor(direction: str, record) -> str:
+    """Encode the (type, id) keyset position of a row as an opaque cursor"""
+    raw = json.dumps({"d": direction, "k": [record["type"], record["id"]]})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, (type, id) = data["d"], data["k"]
+        if direction not in ("next", "prev"):
+            raise ValueError(direction)
+        return direction, (str(type), str(id))
+    except (ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def generate_page_url(limit: int, params, direction: str, record) -> str:
+    query = {"limit": limit, "cursor": encode_cursor(direction, record)}
+    if params.type is not None:
+        query["type"] = params.type
+    query.update(shape_query(params))
+    return f"{URL_PREFIX}/pets/?{urlencode(query)}"
+
+
+def generate_search_url(params: PetSearchParams) -> str:
+    query = {
+        key: str(value).lower() if isinstance(value, bool) else value
+        for key, value in params.model_dump(exclude_defaults=True).items()
+    }
+    query["offset"] = params.offset + params.limit
+    return f"{URL_PREFIX}/pets/search?{urlencode(query)}"
+
+
+def shape_query(params) -> dict:
+    """Query parameters that keep the next/prev page in the same shape"""
+    query = {}
+    if params.fields is not None:
+        query["fields"] = params.fields
+    if not params.links:
+        query["links"] = "false"
+    return query
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate ?fields=id,name,... and return them in PET_FIELDS order"""
+    if fields is None:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = sorted(requested - set(PET_FIELDS))
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "Unknown fields",
+                "fields": unknown,
+                "allowed": PET_FIELDS,
+            },
+        )
+    return tuple(field for field in PET_FIELDS if field in requested)
+
+
+async def generate_export(format: str, type: Optional[str]):
+    # Rows are serialized as they come off the cursor and flushed in small
+    # chunks, so memory stays flat and the first byte goes out immediately
+    chunk = []
+    first = True
+
+    if format == "json":
+        yield "["
+
+    async for record in db_manager.iterate_pets(type=type):
+        line = json.dumps({column: record[column] for column in EXPORT_COLUMNS})
+        if format == "ndjson":
+            chunk.append(line + "\n")
+        else:
+            chunk.append(line if first else "," + line)
+        first = False
+
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield "".join(chunk)
+            chunk = []
+
+    if chunk:
+        yield "".join(chunk)
+
+    if format == "json":
+        yield "]"
+
+
+def pet_etag(record, columns: Tuple[str, ...] = PET_ETAG_COLUMNS) -> str:
+    """Strong ETag from the row version plus a digest of its content.
+
+    The digest keeps the tag unique when a deleted id is re-created and its
+    version starts over.
+    """
+    content = "\x1f".join(str(record[column]) for column in columns)
+    digest = hashlib.blake2b(content.encode(), digest_size=8).hexdigest()
+    return f'"{record["version"]}-{digest}"'
+
+
+def list_etag(
+    records, fields: Optional[Tuple[str, ...]] = None, links: bool = True
+) -> str:
+    """ETag of a listing; each fields/links combination is its own
+    representation and gets its own tag"""
+    digest = hashlib.blake2b(digest_size=16)
+    if fields is not None or not links:
+        digest.update(f"{fields};{links}".encode())
+    columns = PET_ETAG_COLUMNS if fields is None else ("id", *fields)
+    for record in records:
+        digest.update(pet_etag(record, columns).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """Compare an If-None-Match (weak) or If-Match (strong) header to an ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in tags or (weak and f"W/{etag}" in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
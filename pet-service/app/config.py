@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
+from typing import Dict, Optional
 import os
 
 
@@ -17,17 +18,90 @@ class Settings(BaseSettings):
         os.getenv("JWT_REFRESH_SECRET"), env="JWT_REFRESH_SECRET"
     )
 
+    # Directory of <kid>.pem keys; when set, access tokens are signed with
+    # RS256/EdDSA and the public keys are published as JWKS
+    JWT_KEYS_DIR: Optional[str] = Field(None, env="JWT_KEYS_DIR")
+    JWT_ACTIVE_KID: Optional[str] = Field(None, env="JWT_ACTIVE_KID")
+    JWT_JWKS_MAX_AGE: int = Field(300, env="JWT_JWKS_MAX_AGE")
+
+    # Verified access tokens kept in memory per worker (0 disables)
+    JWT_CACHE_SIZE: int = Field(10000, env="JWT_CACHE_SIZE")
+
     CAT_API_KEY: str = Field(os.getenv("CAT_API_KEY"), env="CAT_API_KEY")
+    CAT_API_URL: str = Field(
+        "https://api.thecatapi.com/v1/images/search", env="CAT_API_URL"
+    )
+    CAT_API_TIMEOUT: float = Field(2.0, env="CAT_API_TIMEOUT")
+    # Number of image URLs kept prefetched in the background (0 disables)
+    CAT_API_PREFETCH_SIZE: int = Field(20, env="CAT_API_PREFETCH_SIZE")
+    CAT_API_FALLBACK_IMAGE_URL: Optional[str] = Field(
+        None, env="CAT_API_FALLBACK_IMAGE_URL"
+    )
+
+    # Logging: "text" or "json" (one record per request), written from a
+    # background thread. LOG_SAMPLE_RATES maps path prefixes to the share of
+    # successful requests logged, e.g. {"/api/v1/pets/ops": 0.01}
+    LOG_FORMAT: str = Field("text", env="LOG_FORMAT")
+    LOG_LEVEL: str = Field("INFO", env="LOG_LEVEL")
+    LOG_SAMPLE_RATES: Dict[str, float] = Field({}, env="LOG_SAMPLE_RATES")
+    LOGSTASH_HOST: Optional[str] = Field(None, env="LOGSTASH_HOST")
+    LOGSTASH_PORT: int = Field(5959, env="LOGSTASH_PORT")
+
+    # Insert pets right away and fill image_url in the background
+    IMAGE_ENRICHMENT_ASYNC: bool = Field(False, env="IMAGE_ENRICHMENT_ASYNC")
+    IMAGE_ENRICHMENT_QUEUE_SIZE: int = Field(1000, env="IMAGE_ENRICHMENT_QUEUE_SIZE")
+    IMAGE_ENRICHMENT_BATCH_SIZE: int = Field(25, env="IMAGE_ENRICHMENT_BATCH_SIZE")
 
     # Database settings
+    # asyncpg prepared statement caching: "on" for direct connections,
+    # "off" behind transaction-pooling proxies such as pgbouncer, "auto" turns
+    # it on only for the Cloud SQL Unix socket
+    DB_STATEMENT_CACHE: str = Field("auto", env="DB_STATEMENT_CACHE")
+    DB_STATEMENT_CACHE_SIZE: int = Field(100, env="DB_STATEMENT_CACHE_SIZE")
+    # One pool per worker; with gunicorn -w 4 the container opens at most
+    # 4 * DB_POOL_MAX_SIZE connections
+    DB_POOL_MIN_SIZE: int = Field(1, env="DB_POOL_MIN_SIZE")
+    DB_POOL_MAX_SIZE: int = Field(10, env="DB_POOL_MAX_SIZE")
+    DB_POOL_MAX_IDLE_SECONDS: float = Field(300.0, env="DB_POOL_MAX_IDLE_SECONDS")
+    DB_POOL_ACQUIRE_TIMEOUT: float = Field(5.0, env="DB_POOL_ACQUIRE_TIMEOUT")
+    DB_STATEMENT_TIMEOUT_MS: int = Field(30000, env="DB_STATEMENT_TIMEOUT_MS")
     # DATABASE_URL: str = Field(os.getenv(""), env="DATABASE_URL")
 
     # Security settings
     # SECRET_KEY: str = Field(..., env="SECRET_KEY")
     # ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(30, env="ACCESS_TOKEN_EXPIRE_MINUTES")
 
+    # Response cache for pet lookups: "none", "memory" or "redis"
+    CACHE_BACKEND: str = Field("none", env="CACHE_BACKEND")
+    CACHE_TTL_SECONDS: float = Field(30.0, env="CACHE_TTL_SECONDS")
+    CACHE_MAX_ENTRIES: int = Field(10000, env="CACHE_MAX_ENTRIES")
+    # Seconds a lookup waits for an identical one already in flight; applies
+    # with or without a cache backend
+    SINGLE_FLIGHT_TIMEOUT: float = Field(5.0, env="SINGLE_FLIGHT_TIMEOUT")
+
+    # Change feed (/pets/changes): waiters re-check every poll interval; with
+    # CHANGES_NOTIFY on Postgres, writes from any worker wake them through
+    # LISTEN/NOTIFY (which serializes committing writers on the notify queue)
+    CHANGES_POLL_INTERVAL: float = Field(1.0, env="CHANGES_POLL_INTERVAL")
+    CHANGES_NOTIFY: bool = Field(False, env="CHANGES_NOTIFY")
+    # Seconds a reader waits on a gap in the change sequence before taking it
+    # for a rolled back write; keep above the longest write transaction
+    CHANGES_GAP_TIMEOUT: float = Field(30.0, env="CHANGES_GAP_TIMEOUT")
+    # Seconds changes are kept (0 keeps them all), pruned every prune interval;
+    # consumers further behind get 410 Gone and must resync from the pets
+    CHANGES_RETENTION_SECONDS: float = Field(
+        7 * 24 * 3600.0, env="CHANGES_RETENTION_SECONDS"
+    )
+    CHANGES_PRUNE_INTERVAL: float = Field(60.0, env="CHANGES_PRUNE_INTERVAL")
+    CHANGES_PRUNE_BATCH: int = Field(10000, env="CHANGES_PRUNE_BATCH")
+
+    # /pets/stats: seconds between folds of pending price deltas into the
+    # aggregates (how stale the stats may get), and deltas per fold
+    PET_STATS_FOLD_INTERVAL: float = Field(1.0, env="PET_STATS_FOLD_INTERVAL")
+    PET_STATS_FOLD_BATCH: int = Field(20000, env="PET_STATS_FOLD_BATCH")
+
     # External service settings
-    # REDIS_URL: str = Field(None, env="REDIS_URL")
+    REDIS_URL: Optional[str] = Field(None, env="REDIS_URL")
     # SENTRY_DSN: str = Field(None, env="SENTRY_DSN")
 
     class Config:
@@ -1,18 +1,45 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.pets import pets
-from app.api.db import initialize_database, cleanup
-from app.api.middleware import LoggingMiddleware, JWTMiddleware
+from app.api.db import initialize_database, cleanup, PoolAcquireTimeout
+from app.api.middleware import LoggingMiddleware, JWTMiddleware, MetricsMiddleware
+from app.api.log import configure_logging
 from app.api.auth import auth
+from app.api.cat_api_adapter import initialize_cat_api, cleanup_cat_api
+from app.api.image_enrichment import enrichment_queue
+from app.api.cache import LoadTimeout, pet_cache
+from app.api.change_pruner import change_pruner
+from app.api.changes import change_feed
+from app.api.pet_stats import pet_stats_folder
+from app.api.ops import ops
+from app.api.metrics import metrics
+from app.config import settings
 from contextlib import asynccontextmanager
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup code: connect to the database
+    # Startup code: hand logging to its background thread, then connect to
+    # the database
+    configure_logging()
     await initialize_database()
+    await initialize_cat_api()
+    await pet_cache.start()
+    await change_feed.start()
+    await pet_stats_folder.start()
+    await change_pruner.start()
+    if settings.IMAGE_ENRICHMENT_ASYNC:
+        await enrichment_queue.start()
     yield
-    # Shutdown code: disconnect from the database
+    # Shutdown code: drain pending enrichments, close the Cat API client and
+    # disconnect from the database
+    await enrichment_queue.stop()
+    await pet_cache.stop()
+    await change_feed.stop()
+    await pet_stats_folder.stop()
+    await change_pruner.stop()
+    await cleanup_cat_api()
     await cleanup()
 
 
@@ -22,6 +49,19 @@ app = FastAPI(
     lifespan=lifespan,  # Use lifespan event handler
 )
 
+
+@app.exception_handler(PoolAcquireTimeout)
+@app.exception_handler(LoadTimeout)
+async def overloaded_handler(request: Request, exc: Exception):
+    # Shed load instead of queueing requests behind an exhausted pool or a
+    # lookup that is not coming back
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily overloaded, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+
 origins = [
     "*",
     # "http://localhost",
@@ -47,8 +87,13 @@ app.add_middleware(
         "/api/v1/auth",
         "/api/v1/pets/openapi.json",
         "/api/v1/pets/docs",
+        "/metrics",
     ],
 )
+# Outermost, so rejected and failed requests are timed too
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(pets, prefix="/api/v1/pets", tags=["pets"])
 app.include_router(auth, prefix="/api/v1/auth", tags=["auth"])
+app.include_router(ops, prefix="/api/v1/pets/ops", tags=["ops"])
+app.include_router(metrics)
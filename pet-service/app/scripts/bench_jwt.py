@@ -0,0 +1,90 @@
+"""CPU cost of verifying an access token: full decode vs verified-token cache.
+
+HS256 uses the configured secret; RS256 uses a throwaway 2048-bit key, to show
+what the cache saves once tokens are signed asymmetrically. With --keys-dir
+every private key of that key ring (the same <kid>.pem files JWT_KEYS_DIR
+points at) is measured as well.
+
+    python -m app.scripts.bench_jwt --iterations 20000 --keys-dir ./keys
+"""
+
+import argparse
+import hashlib
+import time
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.api import auth
+from app.api.keyring import KeyRing
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def rsa_keys():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key, private_key.public_key()
+
+
+def bench(name: str, token: str, verify, iterations: int):
+    full = per_call_us(lambda: verify(token), iterations)
+
+    auth.verified_tokens.clear()
+    auth.remember_claims(
+        hashlib.sha256(token.encode()).hexdigest(),
+        verify(token),
+    )
+    cached = per_call_us(
+        lambda: auth.cached_claims(hashlib.sha256(token.encode()).hexdigest()),
+        iterations,
+    )
+    print(f"{name:<16} full decode {full:8.1f} us   cache hit {cached:6.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--keys-dir", help="directory of <kid>.pem files")
+    args = parser.parse_args()
+
+    payload = {
+        "tokenId": "bench",
+        "exp": time.time() + 3600,
+        "iat": time.time(),
+        "type": "access",
+    }
+
+    secret = auth.JWT_SECRET_KEY
+    token = jwt.encode(payload, secret, algorithm="HS256")
+    bench(
+        "HS256",
+        token,
+        lambda t: jwt.decode(t, secret, algorithms=["HS256"]),
+        args.iterations,
+    )
+
+    private_key, public_key = rsa_keys()
+    token = jwt.encode(payload, private_key, algorithm="RS256")
+    bench(
+        "RS256",
+        token,
+        lambda t: jwt.decode(t, public_key, algorithms=["RS256"]),
+        args.iterations,
+    )
+
+    if args.keys_dir:
+        keyring = KeyRing.from_directory(args.keys_dir)
+        for kid, key in keyring.keys.items():
+            if key.private_key is None:
+                continue
+            token = KeyRing(keyring.keys, kid).sign(payload)
+            bench(f"{kid} {key.algorithm}", token, keyring.verify, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Requests/s and latency of the middleware stack on a stubbed route.
+
+Compares the pure ASGI LoggingMiddleware/JWTMiddleware from app.api.middleware
+with equivalent BaseHTTPMiddleware implementations (what the service used
+before), driving both in-process through httpx's ASGI transport.
+
+    python -m app.scripts.bench_middleware --requests 20000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api.auth import create_jwt_token, verify_jwt_token
+from app.api.middleware import JWTMiddleware, LoggingMiddleware, logger
+
+
+class BaseHTTPLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        cor_id = request.headers.get("X-Correlation-ID", str(uuid.uuid4()))
+        request.state.correlation_id = cor_id
+        logger.info(f"[{cor_id}] Request started: {request.method} {request.url}")
+        logger.info(f"[{cor_id}] Query parameters: {request.query_params}")
+        start_time = time.time()
+        response = await call_next(request)
+        logger.info(f"[{cor_id}] Completed in {time.time() - start_time:.4f}s")
+        response.headers["X-Correlation-ID"] = cor_id
+        return response
+
+
+class BaseHTTPJWTMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        token = request.headers.get("Authorization", "").split("Bearer ")[-1]
+        verify_jwt_token(token)
+        return await call_next(request)
+
+
+def build_app(logging_middleware, jwt_middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    app.add_middleware(logging_middleware)
+    app.add_middleware(jwt_middleware)
+    return app
+
+
+async def drive(app: FastAPI, total: int, concurrency: int, headers: dict) -> dict:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", headers=headers
+    ) as client:
+        remaining = iter(range(total))
+
+        async def worker():
+            for _ in remaining:
+                start = time.perf_counter()
+                response = await client.get("/ping")
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 3),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # Measure the middleware, not the terminal
+    logger.setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    token = create_jwt_token({"tokenId": "bench"})["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    apps = {
+        "BaseHTTPMiddleware": build_app(
+            BaseHTTPLoggingMiddleware, BaseHTTPJWTMiddleware
+        ),
+        "pure ASGI": build_app(LoggingMiddleware, JWTMiddleware),
+    }
+    for name, app in apps.items():
+        await drive(app, 500, args.concurrency, headers)  # warm up
+        result = await drive(app, args.requests, args.concurrency, headers)
+        print(f"{name:<20} {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
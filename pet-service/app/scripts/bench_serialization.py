@@ -0,0 +1,125 @@
+"""Throughput of a pet list page: PetOut models vs the orjson fast path.
+
+Both apps answer GET /pets with the same rows (as the database layer returns
+them), one through response_model validation and JSONResponse as the service
+used to, the other through pets.pet_json and ORJSONResponse. The database is
+left out so only the serialization cost is compared.
+
+    python -m app.scripts.bench_serialization --rows 1000 --requests 500
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+
+from app.api.models import Link, PetListResponse, PetOut
+from app.api.pets import URL_PREFIX, pet_json
+
+
+def fake_rows(count: int) -> list:
+    return [
+        {
+            "id": f"pet-{i:06d}",
+            "name": f"Pet {i}",
+            "type": "Cat" if i % 2 else "Dog",
+            "price": 10.0 + i / 100,
+            "breeder_id": f"breeder-{i % 50}",
+            "image_url": f"https://cdn2.thecatapi.com/images/{i}.jpg",
+            "version": 1,
+        }
+        for i in range(count)
+    ]
+
+
+def list_links() -> list:
+    return [
+        Link(rel="self", href=f"{URL_PREFIX}/pets/"),
+        Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
+    ]
+
+
+def build_app(rows: list, fast: bool) -> FastAPI:
+    app = FastAPI()
+
+    if fast:
+
+        @app.get("/pets", response_model=PetListResponse)
+        async def fast_pets():
+            return ORJSONResponse(
+                {
+                    "data": [pet_json(row) for row in rows],
+                    "links": [link.model_dump() for link in list_links()],
+                }
+            )
+
+    else:
+
+        @app.get("/pets", response_model=PetListResponse)
+        async def model_pets():
+            data = [
+                PetOut(
+                    id=row["id"],
+                    name=row["name"],
+                    type=row["type"],
+                    price=row["price"],
+                    breeder_id=row["breeder_id"],
+                    image_url=row["image_url"],
+                    links=[
+                        Link(rel="self", href=f"{URL_PREFIX}/pets/{row['id']}/"),
+                        Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
+                    ],
+                )
+                for row in rows
+            ]
+            return PetListResponse(data=data, links=list_links())
+
+    return app
+
+
+async def drive(app: FastAPI, total: int) -> dict:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        body = (await client.get("/pets")).content
+        start = time.perf_counter()
+        for _ in range(total):
+            request_start = time.perf_counter()
+            response = await client.get("/pets")
+            latencies.append(time.perf_counter() - request_start)
+            assert response.content == body
+        elapsed = time.perf_counter() - start
+
+    return {
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+    }, body
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    # Measure the serialization, not the terminal
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rows = fake_rows(args.rows)
+    bodies = []
+    for name, fast in (("PetOut models", False), ("orjson fast path", True)):
+        result, body = await drive(build_app(rows, fast), args.requests)
+        bodies.append(body)
+        print(f"{name:<18} {result}")
+    print("identical JSON:", bodies[0] == bodies[1])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
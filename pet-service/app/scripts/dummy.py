@@ -1,96 +1,299 @@
-import requests
-import random
+"""Seed the pet service with generated pets.
+
+Pets are derived from --seed alone: pet i gets the same id, name, type,
+price, breeder and (offline) image URL on every run, so a dataset can be
+rebuilt exactly and running the seeder again only updates it. Batches go
+through the bulk API (POST /api/v1/pets/bulk) on one shared client or, with
+--db, straight into the database in DATABASE_URI (COPY on Postgres),
+--concurrency batches at a time:
+
+    python -m app.scripts.dummy --count 1000000 --breeders 500 --offline-images
+    python -m app.scripts.dummy --db --count 5000000 --breeders 2000 \\
+        --offline-images
+
+Without --breeders the breeder ids are fetched from the breeder service, and
+without --offline-images the image URLs come from a pool fetched once from
+the Dog CEO API. The bulk API needs a token: --token, PET_API_TOKEN, or one
+minted with the service's JWT settings when those are in the environment.
+Pets COPYed in with --db do not show up in the /pets/changes feed.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
 import string
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import httpx
+
+BREEDER_URL = "http://localhost:8080/api/v1/breeders/"
+PET_URL = "http://localhost:8082/api/v1/pets"
+# Dog CEO returns at most 50 random images per call
+DOG_IMAGES_URL = "https://dog.ceo/api/breeds/image/random/50"
+
+ID_PREFIX = "dummy-"
+PET_TYPES = (
+    "Dog",
+    "Cat",
+    "Bird",
+    "Rabbit",
+    "Fish",
+    "Hamster",
+    "Lizard",
+    "Snake",
+    "Turtle",
+    "Horse",
+)
+# (Dog CEO breed directory, ImageNet synset) for offline image URLs, which
+# follow the Dog CEO layout without checking that the file exists
+DOG_BREEDS = (
+    ("hound-afghan", "n02088094"),
+    ("beagle", "n02088364"),
+    ("chihuahua", "n02085620"),
+    ("maltese", "n02085936"),
+    ("retriever-golden", "n02099601"),
+    ("labrador", "n02099712"),
+    ("germanshepherd", "n02106662"),
+    ("husky", "n02110185"),
+    ("pembroke", "n02113023"),
+    ("poodle-standard", "n02113799"),
+)
+# Maps every byte value to an ASCII letter, for names
+NAME_LETTERS = bytes(ord(string.ascii_letters[i % 52]) for i in range(256))
+
 
-# API endpoint for breeders and pets
-breeder_url = "http://localhost:8080/api/v1/breeders/"
-pet_url = "http://localhost:8082/api/v1/pets"
-
-# Dog CEO API for generating random dog image URLs
-dog_image_api = "https://dog.ceo/api/breeds/image/random"
-
-
-# Fetch the breeder IDs from the API
-def fetch_breeder_ids():
-    response = requests.get(breeder_url)
-    if response.status_code == 200:
-        breeders = response.json()  # Assuming the data is returned as a JSON array
-        # Extracting all breeder_ids
-        breeder_ids = [breeder['id'] for breeder in breeders['data']]  # Ensure correct key names
-        print(f"Fetched {len(breeder_ids)} breeders")
-        return breeder_ids
-    else:
-        print(f"Failed to fetch breeders. Status Code: {response.status_code}")
-        return []
-
-
-# Fetch a random dog image URL using the Dog CEO API
-def fetch_random_dog_image():
-    try:
-        response = requests.get(dog_image_api)
-        if response.status_code == 200:
-            data = response.json()
-            return data["message"]  # Return the image URL
+def pet_id(i: int, prefix: str = ID_PREFIX) -> str:
+    return f"{prefix}{i:07d}"
+
+
+def generate_pets(
+    start: int,
+    stop: int,
+    seed: int,
+    breeder_ids: Sequence[str],
+    images: Optional[Sequence[str]] = None,
+    prefix: str = ID_PREFIX,
+) -> List[dict]:
+    """Pets start..stop-1, each derived from a hash of (seed, i) only, so the
+    same pet comes out whatever the batch boundaries"""
+    pets = []
+    for i in range(start, stop):
+        digest = hashlib.blake2b(b"%d:%d" % (seed, i), digest_size=24).digest()
+        price = int.from_bytes(digest[11:14], "big") / 0xFFFFFF
+        breeder = int.from_bytes(digest[14:18], "big")
+        image = int.from_bytes(digest[18:22], "big")
+        if images is None:
+            breed, synset = DOG_BREEDS[image % len(DOG_BREEDS)]
+            image_url = (
+                f"https://images.dog.ceo/breeds/{breed}/{synset}_{image % 10000}.jpg"
+            )
         else:
-            print(f"Failed to fetch dog image. Status Code: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"Error fetching dog image: {e}")
-        return None
+            image_url = images[image % len(images)]
+        pets.append(
+            {
+                "id": pet_id(i, prefix),
+                "name": digest[:10].translate(NAME_LETTERS).decode(),
+                "type": PET_TYPES[digest[10] % len(PET_TYPES)],
+                "price": round(50 + price * 450, 2),
+                "breeder_id": breeder_ids[breeder % len(breeder_ids)],
+                "image_url": image_url,
+            }
+        )
+    return pets
+
+
+async def fetch_breeder_ids(client: httpx.AsyncClient, url: str) -> List[str]:
+    response = await client.get(url)
+    response.raise_for_status()
+    return [breeder["id"] for breeder in response.json()["data"]]
 
 
-# Function to generate random dummy pet data
-def generate_dummy_pet(breeder_ids):
-    pet_types = ['Dog', 'Cat', 'Bird', 'Rabbit', 'Fish', 'Hamster', 'Lizard', 'Snake', 'Turtle', 'Horse']
+async def fetch_dog_images(client: httpx.AsyncClient, count: int) -> List[str]:
+    """A pool of about ``count`` Dog CEO image URLs, fetched concurrently"""
+    calls = [client.get(DOG_IMAGES_URL) for _ in range(max(1, -(-count // 50)))]
+    images = []
+    for response in await asyncio.gather(*calls):
+        response.raise_for_status()
+        images += response.json()["message"]
+    return images
 
-    # Generate random pet name
-    pet_name = ''.join(random.choices(string.ascii_uppercase + string.ascii_lowercase, k=10))
 
-    # Choose random pet type
-    pet_type = random.choice(pet_types)
+class Progress:
+    """Pets written so far, reported every ``interval`` seconds"""
 
-    # Generate a random price between 50 and 500
-    price = round(random.uniform(50, 500), 2)
+    def __init__(self, total: int, interval: float = 2.0):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
 
-    # Randomly select a breeder ID
-    breeder_id = random.choice(breeder_ids)
+    def add(self, count: int):
+        self.done += count
 
-    # Fetch a random image URL
-    image_url = fetch_random_dog_image()
+    def line(self) -> str:
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = f"{(self.total - self.done) / rate:.0f}s" if rate else "-"
+        return (
+            f"{self.done:,}/{self.total:,} pets "
+            f"({self.done / self.total if self.total else 1:.1%}) "
+            f"in {elapsed:.1f}s, {rate:,.0f} pets/s, ETA {eta}"
+        )
 
-    return {
-        "name": pet_name,
-        "type": pet_type,
-        "price": price,
-        "breeder_id": breeder_id,
-        "image_url": image_url
-    }
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            print(self.line(), flush=True)
 
 
-# Main function to fetch breeders and add dummy pets
-def create_dummy_pets():
-    # Step 1: Fetch the breeder IDs
-    breeder_ids = fetch_breeder_ids()
-    if not breeder_ids:
-        print("No breeders found. Exiting.")
+async def post_batch(client: httpx.AsyncClient, pets: List[dict], retries: int = 3):
+    """POST one batch to the bulk API, retrying while the service sheds load"""
+    for attempt in range(retries + 1):
+        try:
+            response = await client.post("/bulk", json=pets)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(2**attempt)
+            continue
+        if response.status_code == 503 and attempt < retries:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 2**attempt)))
+            continue
+        response.raise_for_status()
         return
 
-    # Step 2: Create dummy pets linked to the fetched breeders
-    for _ in range(20):  # Adjust the number of dummy pets as needed
-        dummy_pet = generate_dummy_pet(breeder_ids)
 
-        # Sending the POST request to add the pet
-        if dummy_pet["image_url"]:  # Ensure the image URL is valid
-            response = requests.post(pet_url, json=dummy_pet)
+async def write_batch(pets: List[dict]):
+    """Write one batch through the DB layer; COPY on Postgres unless some of
+    the pets already exist, then (and on SQLite) an upsert"""
+    # Imported here: they need the service's settings, the API mode does not
+    from app.api import db_manager
+    from app.api.db import database
+
+    if database.url.dialect == "postgresql":
+        import asyncpg
+
+        try:
+            async with database.connection() as connection:
+                await connection.raw_connection.copy_records_to_table(
+                    "pets",
+                    records=[tuple(pet.values()) for pet in pets],
+                    columns=list(pets[0]),
+                )
+            return
+        except asyncpg.UniqueViolationError:
+            pass
+    await db_manager.bulk_upsert_pets(pets)
+
+
+async def seed(
+    write: Callable[[List[dict]], Awaitable[None]],
+    make_batch: Callable[[int, int], List[dict]],
+    start: int,
+    stop: int,
+    batch_size: int,
+    concurrency: int,
+    progress: Optional[Progress] = None,
+):
+    """Generate and write pets start..stop-1, ``concurrency`` batches at once"""
+    batches = iter(range(start, stop, batch_size))
 
-            # Checking if the request was successful
-            if response.status_code == 201:
-                print(f"Successfully added pet: {dummy_pet['name']} with image URL: {dummy_pet['image_url']}")
-            else:
-                print(f"Failed to add pet: {dummy_pet['name']} - Status Code: {response.status_code}")
+    async def worker():
+        for batch_start in batches:
+            pets = make_batch(batch_start, min(batch_start + batch_size, stop))
+            await write(pets)
+            if progress is not None:
+                progress.add(len(pets))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def api_token() -> str:
+    if os.getenv("PET_API_TOKEN"):
+        return os.environ["PET_API_TOKEN"]
+    from app.api.auth import create_jwt_token
+
+    return create_jwt_token({"tokenId": "dummy-seeder"})["access_token"]
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=positive_int, default=1000)
+    parser.add_argument("--start", type=int, default=0, help="Index of the first pet")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--batch-size", type=positive_int, default=1000)
+    parser.add_argument("--concurrency", type=positive_int, default=8)
+    parser.add_argument("--db", action="store_true", help="Write to DATABASE_URI")
+    parser.add_argument("--pet-url", default=PET_URL)
+    parser.add_argument("--token", help="Bearer token for the bulk API")
+    parser.add_argument("--breeders", type=int, help="Generate this many breeder ids")
+    parser.add_argument("--breeder-url", default=BREEDER_URL)
+    parser.add_argument("--offline-images", action="store_true")
+    parser.add_argument("--image-pool", type=int, default=500)
+    parser.add_argument("--id-prefix", default=ID_PREFIX)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(
+        base_url=args.pet_url,
+        timeout=60,
+        limits=httpx.Limits(max_connections=args.concurrency),
+    ) as client:
+        if args.breeders:
+            breeder_ids = [f"breeder-{n:05d}" for n in range(args.breeders)]
         else:
-            print(f"Skipping pet {dummy_pet['name']} due to missing image URL.")
+            breeder_ids = await fetch_breeder_ids(client, args.breeder_url)
+            print(f"Fetched {len(breeder_ids)} breeders")
+        if not breeder_ids:
+            print("No breeders found. Exiting.")
+            return
+        images = None
+        if not args.offline_images:
+            images = await fetch_dog_images(client, args.image_pool)
+            print(f"Fetched {len(images)} dog images")
+
+        def make_batch(start: int, stop: int) -> List[dict]:
+            return generate_pets(
+                start, stop, args.seed, breeder_ids, images, args.id_prefix
+            )
+
+        if args.db:
+            from app.api.db import cleanup, initialize_database
+
+            await initialize_database()
+            write = write_batch
+        else:
+            client.headers["Authorization"] = f"Bearer {args.token or api_token()}"
+
+            async def write(pets: List[dict]):
+                await post_batch(client, pets)
+
+        progress = Progress(args.count)
+        reporter = asyncio.create_task(progress.report())
+        try:
+            await seed(
+                write,
+                make_batch,
+                args.start,
+                args.start + args.count,
+                args.batch_size,
+                args.concurrency,
+                progress,
+            )
+        finally:
+            reporter.cancel()
+            if args.db:
+                await cleanup()
+        print(progress.line())
 
 
-# Run the function to create dummy pets
-create_dummy_pets()
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,7 +3,8 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from databases import Database
-from app.api.db import metadata, engine
+from app.api.db import metadata
+from app.api.migrations import apply_migrations
 import os
 
 # Override DATABASE_URI for testing
@@ -36,9 +37,10 @@ async def override_dependency(monkeypatch, test_database, test_engine):
 
     monkeypatch.setattr(db, "database", test_database)
     monkeypatch.setattr(db, "DATABASE_URI", TEST_DATABASE_URL)
-    monkeypatch.setattr(db, "engine", test_engine)
 
     await test_database.connect()
+    # Objects outside metadata, such as the FTS5 search index
+    await apply_migrations(test_database)
     yield
     await test_database.disconnect()
 
@@ -54,7 +56,11 @@ def test_app(override_dependency):
 @pytest.fixture
 def test_client(test_app):
     """Create a test client"""
-    return TestClient(test_app)
+    from app.api.auth import create_jwt_token
+
+    # Every pets route sits behind JWTMiddleware, so authenticate the client
+    token = create_jwt_token({"tokenId": "test"})["access_token"]
+    return TestClient(test_app, headers={"Authorization": f"Bearer {token}"})
 
 
 @pytest.fixture(autouse=True)
@@ -62,3 +68,12 @@ async def cleanup_database(test_database):
     """Clean up the database between tests"""
     yield
     await test_database.execute("DELETE FROM pets")
+    await test_database.execute("DELETE FROM pet_changes")
+    # Restart the change sequence, so since=0 reads from seq 1 again
+    await test_database.execute(
+        "DELETE FROM sqlite_sequence WHERE name = 'pet_changes'"
+    )
+    await test_database.execute("UPDATE pet_changes_pruned SET seq = 0")
+    await test_database.execute("DELETE FROM pet_stat_deltas")
+    await test_database.execute("DELETE FROM pet_stat_buckets")
+    await test_database.execute("DELETE FROM pet_stats")
@@ -0,0 +1,84 @@
+import jwt
+import pytest
+from starlette.requests import Request
+
+from app.api import auth
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    auth.verified_tokens.clear()
+    yield
+    auth.verified_tokens.clear()
+
+
+@pytest.fixture
+def count_decodes(monkeypatch):
+    calls = []
+    decode = jwt.decode
+
+    def counting_decode(*args, **kwargs):
+        calls.append(args[0])
+        return decode(*args, **kwargs)
+
+    monkeypatch.setattr(auth.jwt, "decode", counting_decode)
+    return calls
+
+
+def test_verified_tokens_are_cached(count_decodes):
+    token = auth.create_jwt_token({"tokenId": "user-1"})["access_token"]
+
+    first = auth.verify_jwt_token(token)
+    second = auth.verify_jwt_token(token)
+
+    assert first == second
+    assert len(count_decodes) == 1
+    assert token not in auth.verified_tokens
+
+
+def test_cached_claims_are_copies(count_decodes):
+    token = auth.create_jwt_token({"tokenId": "user-1"})["access_token"]
+    auth.verify_jwt_token(token)["tokenId"] = "someone-else"
+    auth.verify_jwt_token(token)["tokenId"] = "someone-else"
+
+    assert auth.verify_jwt_token(token)["tokenId"] == "user-1"
+    assert len(count_decodes) == 1
+
+
+def test_cached_token_expires_with_exp(count_decodes, monkeypatch):
+    token = auth.create_jwt_token({"tokenId": "user-1"})["access_token"]
+    payload = auth.verify_jwt_token(token)
+
+    # Once the clock passes exp the entry must not be served again
+    monkeypatch.setattr(auth.time, "time", lambda: payload["exp"] + 1)
+    token_hash = next(iter(auth.verified_tokens))
+    assert auth.cached_claims(token_hash) is None
+    assert token_hash not in auth.verified_tokens
+
+    with pytest.raises(auth.HTTPException) as error:
+        auth.verify_jwt_token(token)
+    assert error.value.status_code == 401
+    assert len(count_decodes) == 2
+
+
+def test_refresh_tokens_are_not_cached(count_decodes):
+    token = auth.create_jwt_token({"tokenId": "user-1"})["refresh_token"]
+    auth.verify_jwt_token(token, is_refresh=True)
+    auth.verify_jwt_token(token, is_refresh=True)
+    assert len(count_decodes) == 2
+
+
+def test_token_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(auth, "TOKEN_CACHE_SIZE", 2)
+    for i in range(3):
+        token = auth.create_jwt_token({"tokenId": f"user-{i}"})["access_token"]
+        auth.verify_jwt_token(token)
+    assert len(auth.verified_tokens) == 2
+
+
+async def test_get_current_user_reuses_middleware_claims(count_decodes):
+    claims = {"tokenId": "user-1", "type": "access"}
+    request = Request({"type": "http", "state": {"user": claims}})
+
+    assert await auth.get_current_user(request, None) is claims
+    assert count_decodes == []
@@ -0,0 +1,238 @@
+import asyncio
+
+import pytest
+
+from app.api.cache import (
+    LoadTimeout,
+    LocalInvalidationBus,
+    MemoryCache,
+    ResponseCache,
+    SingleFlight,
+)
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    """Route db_manager lookups through an in-process cache"""
+    from app.api import db_manager
+
+    cache = ResponseCache(MemoryCache(max_entries=100, ttl=60))
+    monkeypatch.setattr(db_manager, "pet_cache", cache)
+    return cache
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_lru_and_ttl(monkeypatch):
+    cache = MemoryCache(max_entries=2, ttl=10)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    await cache.get("a")
+    await cache.set("c", 3)
+
+    # "b" was least recently used and got evicted
+    assert await cache.get("b") is None
+    assert await cache.get("a") == 1
+
+    monkeypatch.setattr("app.api.cache.time.monotonic", lambda: float("inf"))
+    assert await cache.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers():
+    bus = LocalInvalidationBus()
+    worker_a = ResponseCache(MemoryCache(), bus)
+    worker_b = ResponseCache(MemoryCache(), bus)
+
+    async def load():
+        return {"name": "cached"}
+
+    await worker_a.get_or_load("pet:1", load)
+    await worker_b.get_or_load("pet:1", load)
+    assert worker_b.stats()["misses"] == 1
+
+    await worker_a.invalidate(["pet:1"])
+    await worker_b.get_or_load("pet:1", load)
+    assert worker_b.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_get_pet_is_cached_and_invalidated(test_client, memory_cache):
+    pet = {
+        "name": "Cached",
+        "type": "Cat",
+        "price": 10.0,
+        "breeder_id": "b1",
+        "image_url": "http://img/x.jpg",
+    }
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+
+    test_client.get(f"/api/v1/pets/{pet_id}/")
+    test_client.get(f"/api/v1/pets/{pet_id}/")
+    assert memory_cache.hits >= 1
+
+    response = test_client.put(f"/api/v1/pets/{pet_id}/", json={"name": "Renamed"})
+    assert response.json()["name"] == "Renamed"
+    assert test_client.get(f"/api/v1/pets/{pet_id}/").json()["name"] == "Renamed"
+
+
+@pytest.mark.asyncio
+async def test_breeder_list_invalidated_when_pet_moves(test_client, memory_cache):
+    pet = {
+        "name": "Mover",
+        "type": "Cat",
+        "price": 10.0,
+        "breeder_id": "old",
+        "image_url": "http://img/x.jpg",
+    }
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+
+    assert len(test_client.get("/api/v1/pets/breeder/old/").json()) == 1
+    assert len(test_client.get("/api/v1/pets/breeder/new/").json()) == 0
+
+    test_client.put(f"/api/v1/pets/{pet_id}/", json={"breeder_id": "new"})
+
+    assert len(test_client.get("/api/v1/pets/breeder/old/").json()) == 0
+    assert len(test_client.get("/api/v1/pets/breeder/new/").json()) == 1
+
+    test_client.delete(f"/api/v1/pets/{pet_id}/")
+    assert len(test_client.get("/api/v1/pets/breeder/new/").json()) == 0
+
+
+@pytest.mark.asyncio
+async def test_get_many_or_load_loads_only_misses():
+    cache = ResponseCache(MemoryCache())
+    loaded = []
+
+    async def load(keys):
+        loaded.append(keys)
+        return {key: {"key": key} for key in keys if key != "pet:gone"}
+
+    found = await cache.get_many_or_load(["pet:1", "pet:gone"], load)
+    assert found == {"pet:1": {"key": "pet:1"}}
+
+    found = await cache.get_many_or_load(["pet:1", "pet:2", "pet:gone"], load)
+    assert set(found) == {"pet:1", "pet:2"}
+    # Cached keys are not loaded again; unknown ones are, as nothing is stored
+    assert loaded == [["pet:1", "pet:gone"], ["pet:2", "pet:gone"]]
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_load(monkeypatch):
+    from app.api import db_manager
+
+    cache = ResponseCache()
+    monkeypatch.setattr(db_manager, "pet_cache", cache)
+    loads = []
+
+    async def fetch_pet(id):
+        loads.append(id)
+        await asyncio.sleep(0.01)
+        return {"id": id}
+
+    monkeypatch.setattr(db_manager, "fetch_pet", fetch_pet)
+    found = await asyncio.gather(
+        *(db_manager.get_pet("hot") for _ in range(10)), db_manager.get_pet("cold")
+    )
+
+    assert [pet["id"] for pet in found] == ["hot"] * 10 + ["cold"]
+    assert sorted(loads) == ["cold", "hot"]
+    assert cache.stats()["single_flight"] == {
+        "loads": 2,
+        "merged": 9,
+        "timeouts": 0,
+        "in_flight": 0,
+    }
+
+    # Once landed, the next lookup loads again
+    await db_manager.get_pet("hot")
+    assert len(loads) == 3
+
+
+@pytest.mark.asyncio
+async def test_stats_with_and_without_value_load_apart(monkeypatch):
+    from app.api import db_manager
+
+    cache = ResponseCache()
+    monkeypatch.setattr(db_manager, "pet_cache", cache)
+
+    async def fetch_pet_stats(dimension, value, limit, offset):
+        await asyncio.sleep(0.01)
+        return [{"value": value}]
+
+    monkeypatch.setattr(db_manager, "fetch_pet_stats", fetch_pet_stats)
+    # value=None means every type; "None" is a type like any other
+    every, named = await asyncio.gather(
+        db_manager.get_pet_stats("type", None, 100, 0),
+        db_manager.get_pet_stats("type", "None", 100, 0),
+    )
+
+    assert every == [{"value": None}]
+    assert named == [{"value": "None"}]
+    assert cache.stats()["single_flight"]["merged"] == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidation_starts_a_fresh_load():
+    cache = ResponseCache(MemoryCache())
+    release = asyncio.Event()
+    versions = iter([1, 2])
+
+    async def load():
+        version = next(versions)
+        await release.wait()
+        return {"version": version}
+
+    before = asyncio.create_task(cache.get_or_load("pet:1", load))
+    await asyncio.sleep(0)
+    # A write lands while the first load is in flight: later lookups must not
+    # join a load that may have read the old row
+    await cache.invalidate(["pet:1"])
+    after = asyncio.create_task(cache.get_or_load("pet:1", load))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert (await before)["version"] == 1
+    assert (await after)["version"] == 2
+    assert cache.flights.loads == 2
+
+
+@pytest.mark.asyncio
+async def test_single_flight_timeout_leaves_the_load_running():
+    flights = SingleFlight(timeout=0.01)
+    release = asyncio.Event()
+
+    async def load():
+        await release.wait()
+        return "done"
+
+    with pytest.raises(LoadTimeout):
+        await flights.do("breeder:b1", load)
+    assert flights.stats()["in_flight"] == 1
+
+    waiting = asyncio.create_task(flights.do("breeder:b1", load, timeout=1))
+    await asyncio.sleep(0)
+    release.set()
+    assert await waiting == "done"
+    assert flights.stats() == {
+        "loads": 1,
+        "merged": 1,
+        "timeouts": 1,
+        "in_flight": 0,
+    }
+
+
+def test_lookup_timeout_is_a_503(test_client, monkeypatch):
+    from app.api import db_manager
+
+    async def fetch_pet(id):
+        await asyncio.sleep(1)
+
+    monkeypatch.setattr(
+        db_manager, "pet_cache", ResponseCache(flights=SingleFlight(timeout=0.01))
+    )
+    monkeypatch.setattr(db_manager, "fetch_pet", fetch_pet)
+
+    response = test_client.get("/api/v1/pets/slow/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
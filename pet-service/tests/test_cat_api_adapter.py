@@ -0,0 +1,103 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.api.cat_api_adapter import CatAPIAdapter, ImagePrefetchPool
+
+
+def stub_client(calls: list, status_code: int = 200) -> httpx.AsyncClient:
+    """httpx client backed by a local stub of The Cat API"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        limit = int(request.url.params.get("limit", 1))
+        images = [{"url": f"http://cats/{len(calls)}-{i}.jpg"} for i in range(limit)]
+        return httpx.Response(status_code, json=images)
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+@pytest.mark.asyncio
+async def test_retrieve_images_uses_batch_limit():
+    calls = []
+    adapter = CatAPIAdapter(client=stub_client(calls))
+
+    images = await adapter.retrieve_images(5)
+
+    assert len(images) == 5
+    assert len(calls) == 1
+    assert calls[0].url.params["limit"] == "5"
+
+
+@pytest.mark.asyncio
+async def test_retrieve_image_falls_back_on_error(monkeypatch):
+    from app.config import settings
+
+    fallback = "http://cats/default.jpg"
+    monkeypatch.setattr(settings, "CAT_API_FALLBACK_IMAGE_URL", fallback)
+    adapter = CatAPIAdapter(client=stub_client([], status_code=503))
+
+    assert await adapter.retrieve_image() == fallback
+
+
+@pytest.mark.asyncio
+async def test_prefetch_pool_refills_in_background():
+    calls = []
+    pool = ImagePrefetchPool(CatAPIAdapter(client=stub_client(calls)), size=4)
+    pool.start()
+    try:
+        for _ in range(50):
+            if len(pool) == 4:
+                break
+            await asyncio.sleep(0.01)
+        assert len(pool) == 4
+
+        # Draining past the low watermark triggers one batched top-up
+        popped = [pool.pop() for _ in range(3)]
+        assert all(url.startswith("http://cats/") for url in popped)
+        for _ in range(50):
+            if len(pool) == 4:
+                break
+            await asyncio.sleep(0.01)
+        assert len(pool) == 4
+        assert len(calls) == 2
+    finally:
+        await pool.stop()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("body", [{"message": "rate limited"}, ["not-an-image"]])
+async def test_retrieve_images_rejects_unexpected_json(body):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=body)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    assert await CatAPIAdapter(client=client).retrieve_images(3) == []
+
+
+@pytest.mark.asyncio
+async def test_prefetch_pool_survives_adapter_errors(monkeypatch):
+    from app.api import cat_api_adapter
+
+    monkeypatch.setattr(cat_api_adapter, "REFILL_RETRY_SECONDS", 0.01)
+
+    class FlakyAdapter:
+        calls = 0
+
+        async def retrieve_images(self, limit: int = 1):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("boom")
+            return [f"http://cats/{i}.jpg" for i in range(limit)]
+
+    pool = ImagePrefetchPool(FlakyAdapter(), size=2)
+    pool.start()
+    try:
+        for _ in range(50):
+            if len(pool) == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert len(pool) == 2
+    finally:
+        await pool.stop()
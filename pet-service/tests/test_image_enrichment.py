@@ -0,0 +1,67 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from app.api.models import PetIn
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class StubAdapter:
+    def __init__(self):
+        self.calls = []
+
+    async def retrieve_images(self, limit: int = 1):
+        self.calls.append(limit)
+        return [f"http://cats/{len(self.calls)}-{i}.jpg" for i in range(limit)]
+
+
+@pytest.mark.asyncio
+async def test_enrichment_queue_fills_images_in_batches():
+    # Imported lazily so db_manager binds to the test database
+    from app.api import db_manager
+    from app.api.image_enrichment import ImageEnrichmentQueue
+
+    pet_ids = [f"enrich-{i}" for i in range(5)]
+    for pet_id in pet_ids:
+        pet = PetIn(name=pet_id, type="Cat", price=10.0, breeder_id="b1")
+        await db_manager.add_pet(pet, pet_id=pet_id)
+
+    adapter = StubAdapter()
+    queue = ImageEnrichmentQueue(adapter=adapter, maxsize=10, batch_size=5)
+    await queue.start()
+    assert all(queue.enqueue(pet_id) for pet_id in pet_ids)
+    await queue.stop()
+
+    assert adapter.calls == [5]
+    assert queue.stats()["enriched"] == 5
+    assert queue.depth == 0
+    for pet_id in pet_ids:
+        pet = await db_manager.get_pet(pet_id)
+        assert pet["image_url"].startswith("http://cats/")
+
+
+@pytest.mark.asyncio
+async def test_enrichment_queue_backpressure():
+    from app.api.image_enrichment import ImageEnrichmentQueue
+
+    queue = ImageEnrichmentQueue(adapter=StubAdapter(), maxsize=1)
+    assert not queue.enqueue("not-started")
+
+    depth = sample("image_enrichment_queue_depth")
+    dropped = sample("image_enrichment_dropped_total", reason="full")
+    await queue.start()
+    queue._task.cancel()  # Stall the worker so the queue stays full
+    assert queue.enqueue("first")
+    assert not queue.accepting()
+    assert not queue.enqueue("second")
+    assert queue.stats()["rejected"] == 1
+    assert sample("image_enrichment_queue_depth") == depth + 1
+    assert sample("image_enrichment_dropped_total", reason="full") == dropped + 1
+
+    # Whatever is still queued once the drain times out is dropped
+    shutdown = sample("image_enrichment_dropped_total", reason="shutdown")
+    await queue.stop(timeout=0.01)
+    assert sample("image_enrichment_queue_depth") == depth
+    assert sample("image_enrichment_dropped_total", reason="shutdown") == shutdown + 1
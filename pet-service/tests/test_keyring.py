@@ -0,0 +1,117 @@
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+from fastapi import HTTPException
+
+from app.api import auth
+from app.api.keyring import KeyRing, KeyRingError
+
+
+def write_private_key(path, key):
+    path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+
+
+def write_public_key(path, key):
+    path.write_bytes(
+        key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+    )
+
+
+@pytest.fixture
+def keys_dir(tmp_path):
+    # An older key that has been rotated out: only its public half remains
+    write_public_key(tmp_path / "2026-01.pem", ed25519.Ed25519PrivateKey.generate())
+    write_private_key(
+        tmp_path / "2026-06.pem",
+        rsa.generate_private_key(public_exponent=65537, key_size=2048),
+    )
+    write_private_key(tmp_path / "2026-10.pem", ed25519.Ed25519PrivateKey.generate())
+    return tmp_path
+
+
+@pytest.fixture
+def use_keyring(monkeypatch, keys_dir):
+    keyring = KeyRing.from_directory(str(keys_dir))
+    monkeypatch.setattr(auth, "keyring", keyring)
+    auth.verified_tokens.clear()
+    yield keyring
+    auth.verified_tokens.clear()
+
+
+def test_keys_are_loaded_from_files(keys_dir):
+    keyring = KeyRing.from_directory(str(keys_dir))
+
+    assert set(keyring.keys) == {"2026-01", "2026-06", "2026-10"}
+    assert keyring.active_kid == "2026-10"
+    assert keyring.signing_key.algorithm == "EdDSA"
+    assert keyring.keys["2026-06"].algorithm == "RS256"
+    assert keyring.keys["2026-01"].private_key is None
+
+
+def test_active_kid_must_have_a_private_key(keys_dir):
+    with pytest.raises(KeyRingError):
+        KeyRing.from_directory(str(keys_dir), active_kid="2026-01")
+
+
+def test_rotated_keys_still_verify(keys_dir):
+    old = KeyRing.from_directory(str(keys_dir), active_kid="2026-06")
+    token = old.sign({"tokenId": "user-1"})
+
+    current = KeyRing.from_directory(str(keys_dir))
+    assert jwt.get_unverified_header(token)["kid"] == "2026-06"
+    assert current.verify(token)["tokenId"] == "user-1"
+
+
+def test_unknown_kid_is_rejected(keys_dir, tmp_path_factory):
+    other_dir = tmp_path_factory.mktemp("other")
+    write_private_key(other_dir / "rogue.pem", ed25519.Ed25519PrivateKey.generate())
+    token = KeyRing.from_directory(str(other_dir)).sign({"tokenId": "user-1"})
+
+    with pytest.raises(jwt.InvalidTokenError):
+        KeyRing.from_directory(str(keys_dir)).verify(token)
+
+
+def test_access_tokens_are_signed_by_keyring(use_keyring):
+    tokens = auth.create_jwt_token({"tokenId": "user-1"})
+
+    header = jwt.get_unverified_header(tokens["access_token"])
+    assert header == {"alg": "EdDSA", "kid": "2026-10", "typ": "JWT"}
+    assert auth.verify_jwt_token(tokens["access_token"])["tokenId"] == "user-1"
+    # Refresh tokens stay on the HMAC secret
+    assert jwt.get_unverified_header(tokens["refresh_token"])["alg"] == "HS256"
+    auth.verify_jwt_token(tokens["refresh_token"], is_refresh=True)
+
+
+def test_tampered_token_is_rejected(use_keyring):
+    token = auth.create_jwt_token({"tokenId": "user-1"})["access_token"]
+    header, payload, signature = token.split(".")
+    forged = use_keyring.sign({"tokenId": "admin"}).split(".")[1]
+
+    with pytest.raises(HTTPException) as exc:
+        auth.verify_jwt_token(".".join([header, forged, signature]))
+    assert exc.value.status_code == 401
+
+
+def test_jwks_verifies_tokens_offline(use_keyring, test_client):
+    response = test_client.get("/api/v1/auth/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=300"
+
+    jwks = jwt.PyJWKSet.from_dict(response.json())
+    assert {key.key_id for key in jwks.keys} == {"2026-01", "2026-06", "2026-10"}
+    assert all("d" not in key for key in response.json()["keys"])
+
+    token = auth.create_jwt_token({"tokenId": "user-1"})["access_token"]
+    key = jwks[jwt.get_unverified_header(token)["kid"]]
+    payload = jwt.decode(token, key.key, algorithms=[key.algorithm_name])
+    assert payload["tokenId"] == "user-1"
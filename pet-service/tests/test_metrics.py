@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.api.cat_api_adapter import CatAPIAdapter
+from app.api.metrics import get_metrics
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_needs_no_token(test_app):
+    response = TestClient(test_app).get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "http_request_duration_seconds" in response.text
+
+
+@pytest.mark.asyncio
+async def test_requests_and_queries_are_timed(test_client):
+    labels = {"method": "GET", "route": "/api/v1/pets/{id}/", "status": "404"}
+    requests_before = sample("http_request_duration_seconds_count", **labels)
+    queries_before = sample("db_query_duration_seconds_count", function="fetch_pet")
+
+    response = test_client.get("/api/v1/pets/no-such-pet/")
+    assert response.status_code == 404
+
+    # Labelled by route template, not by the raw path
+    assert sample("http_request_duration_seconds_count", **labels) == (
+        requests_before + 1
+    )
+    assert sample("db_query_duration_seconds_count", function="fetch_pet") == (
+        queries_before + 1
+    )
+
+
+@pytest.mark.asyncio
+async def test_cat_api_errors_are_counted():
+    def handler(request):
+        raise httpx.ConnectError("refused")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    before = sample("cat_api_errors_total", error="ConnectError")
+
+    assert await CatAPIAdapter(client=client).retrieve_images(3) == []
+    assert sample("cat_api_errors_total", error="ConnectError") == before + 1
+
+
+def test_metrics_are_aggregated_across_workers(tmp_path, monkeypatch):
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    worker = (
+        "from app.api.metrics import DB_QUERY_LATENCY;"
+        "DB_QUERY_LATENCY.labels('fetch_pet').observe(0.002)"
+    )
+    for _ in range(2):
+        subprocess.run([sys.executable, "-c", worker], check=True, env=os.environ)
+
+    body = get_metrics().body.decode()
+    assert 'db_query_duration_seconds_count{function="fetch_pet"} 2.0' in body
@@ -0,0 +1,125 @@
+import json
+import logging
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.log import CorrelationIdFilter, JSONFormatter, correlation_id
+from app.api.middleware import LoggingMiddleware, logger
+
+
+class RecordCollector(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+@pytest.fixture
+def request_logs():
+    # Logging is configured by the app lifespan, which these apps do not run
+    collector = RecordCollector()
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(collector)
+    yield collector.records
+    logger.removeHandler(collector)
+    logger.setLevel(level)
+
+
+@pytest.fixture
+def anonymous_client(test_app):
+    return TestClient(test_app)
+
+
+@pytest.mark.asyncio
+async def test_correlation_id_is_propagated(test_client):
+    response = test_client.get(
+        "/api/v1/pets/", headers={"X-Correlation-ID": "trace-123"}
+    )
+    assert response.status_code == 200
+    assert response.headers["X-Correlation-ID"] == "trace-123"
+
+    # One is generated when the caller does not send any
+    response = test_client.get("/api/v1/pets/")
+    assert response.headers["X-Correlation-ID"]
+
+
+@pytest.mark.asyncio
+async def test_missing_and_malformed_authorization(anonymous_client):
+    response = anonymous_client.get("/api/v1/pets/")
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Authorization header is missing"}
+
+    response = anonymous_client.get(
+        "/api/v1/pets/", headers={"Authorization": "Token abc"}
+    )
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid Authorization header format"}
+
+    response = anonymous_client.get(
+        "/api/v1/pets/", headers={"Authorization": "Bearer not-a-jwt"}
+    )
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Invalid token"}
+
+
+@pytest.mark.asyncio
+async def test_excluded_paths_skip_authentication(anonymous_client):
+    response = anonymous_client.get("/api/v1/pets/openapi.json")
+    assert response.status_code == 200
+    assert "X-Correlation-ID" in response.headers
+
+
+@pytest.mark.asyncio
+async def test_one_structured_record_per_request(test_client, request_logs):
+    test_client.get(
+        "/api/v1/pets/?limit=5", headers={"X-Correlation-ID": "trace-456"}
+    )
+
+    (record,) = [r for r in request_logs if hasattr(r, "http")]
+    assert record.http["method"] == "GET"
+    assert record.http["path"] == "/api/v1/pets/"
+    assert record.http["query"] == "limit=5"
+    assert record.http["status"] == 200
+    assert "trace-456" in record.getMessage()
+
+
+def test_json_formatter_carries_correlation_id():
+    token = correlation_id.set("trace-789")
+    try:
+        record = logging.LogRecord(
+            "pet-service", logging.INFO, __file__, 1, "done %s", ("ok",), None
+        )
+        record.http = {"status": 200}
+        CorrelationIdFilter().filter(record)
+    finally:
+        correlation_id.reset(token)
+
+    entry = json.loads(JSONFormatter().format(record))
+    assert entry["message"] == "done ok"
+    assert entry["correlation_id"] == "trace-789"
+    assert entry["http"] == {"status": 200}
+
+
+@pytest.mark.asyncio
+async def test_sampled_routes_still_log_failures(request_logs):
+    app = FastAPI()
+
+    @app.get("/noisy")
+    async def noisy(fail: bool = False):
+        if fail:
+            raise HTTPException(status_code=404)
+        return {}
+
+    app.add_middleware(LoggingMiddleware, sample_rates={"/noisy": 0.0})
+    client = TestClient(app)
+
+    client.get("/noisy")
+    client.get("/noisy?fail=true")
+
+    statuses = [r.http["status"] for r in request_logs if hasattr(r, "http")]
+    assert statuses == [404]
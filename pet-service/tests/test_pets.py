@@ -145,3 +145,656 @@ async def test_cleanup_between_tests(test_client, test_database):
     response = test_client.get("/api/v1/pets/")
     assert response.status_code == 200
     assert len(response.json()["data"]) == 0
+
+
+def _cursor_from(links, rel):
+    from urllib.parse import parse_qs, urlparse
+
+    href = next((link["href"] for link in links if link["rel"] == rel), None)
+    return parse_qs(urlparse(href).query)["cursor"][0] if href else None
+
+
+@pytest.mark.asyncio
+async def test_get_pets_cursor_pagination(test_client, sample_pet):
+    created = []
+    for i in range(5):
+        pet = {**sample_pet, "name": f"Pet {i}", "image_url": "http://img/x.jpg"}
+        response = test_client.post("/api/v1/pets/", json=pet)
+        assert response.status_code == 201
+        created.append(response.json()["id"])
+
+    # paginate=cursor starts cursor paging from the first page
+    seen = []
+    response = test_client.get(
+        "/api/v1/pets/", params={"limit": 2, "paginate": "cursor"}
+    )
+    assert response.status_code == 200
+    page = response.json()
+    assert _cursor_from(page["links"], "prev") is None
+    seen += [pet["id"] for pet in page["data"]]
+
+    while (cursor := _cursor_from(page["links"], "next")) is not None:
+        page = test_client.get(
+            "/api/v1/pets/", params={"limit": 2, "cursor": cursor}
+        ).json()
+        seen += [pet["id"] for pet in page["data"]]
+
+    assert sorted(seen) == sorted(created)
+    assert len(page["data"]) == 1
+
+    # Walking back from the last page returns the page before it
+    prev_page = test_client.get(
+        "/api/v1/pets/",
+        params={"limit": 2, "cursor": _cursor_from(page["links"], "prev")},
+    ).json()
+    assert [pet["id"] for pet in prev_page["data"]] == seen[2:4]
+    assert _cursor_from(prev_page["links"], "next") is not None
+
+
+@pytest.mark.asyncio
+async def test_get_pets_invalid_cursor(test_client):
+    response = test_client.get("/api/v1/pets/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_get_pets_offset_pagination(test_client, sample_pet):
+    for i in range(3):
+        pet = {**sample_pet, "name": f"Pet {i}", "image_url": "http://img/x.jpg"}
+        test_client.post("/api/v1/pets/", json=pet)
+
+    response = test_client.get("/api/v1/pets/", params={"limit": 2, "offset": 0})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["data"]) == 2
+    next_link = next(link for link in body["links"] if link["rel"] == "next")
+    assert next_link["href"].endswith("?limit=2&offset=2")
+
+    # A limit alone keeps to limit/offset paging
+    body = test_client.get("/api/v1/pets/", params={"limit": 2}).json()
+    next_link = next(link for link in body["links"] if link["rel"] == "next")
+    assert next_link["href"].endswith("?limit=2&offset=2")
+
+
+@pytest.mark.asyncio
+async def test_export_pets_ndjson(test_client, sample_pet):
+    import json
+
+    for i in range(3):
+        pet = {**sample_pet, "name": f"Pet {i}", "image_url": "http://img/x.jpg"}
+        test_client.post("/api/v1/pets/", json=pet)
+
+    response = test_client.get("/api/v1/pets/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(row["name"] for row in rows) == ["Pet 0", "Pet 1", "Pet 2"]
+
+    response = test_client.get("/api/v1/pets/export", params={"format": "json"})
+    assert response.status_code == 200
+    assert len(response.json()) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_pets_empty(test_client):
+    response = test_client.get("/api/v1/pets/export", params={"format": "json"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_pets(test_client, sample_pet):
+    image_url = "http://img/x.jpg"
+    pets = [
+        {**sample_pet, "id": f"bulk-{i}", "name": f"Pet {i}", "image_url": image_url}
+        for i in range(3)
+    ]
+    response = test_client.post("/api/v1/pets/bulk", json=pets)
+    assert response.status_code == 200
+    assert [item["status"] for item in response.json()["data"]] == ["created"] * 3
+
+    # Re-sending an existing id updates it in place
+    pets = [{**pets[0], "name": "Renamed"}, {**sample_pet, "name": "New Pet"}]
+    response = test_client.post("/api/v1/pets/bulk", json=pets)
+    assert response.status_code == 200
+    results = response.json()["data"]
+    assert results[0] == {**results[0], "id": "bulk-0", "status": "updated"}
+    assert results[1]["status"] == "created"
+
+    assert test_client.get("/api/v1/pets/bulk-0").json()["name"] == "Renamed"
+    assert len(test_client.get("/api/v1/pets/").json()["data"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_pets_duplicate_ids(test_client, sample_pet):
+    pets = [{**sample_pet, "id": "dup"}, {**sample_pet, "id": "dup"}]
+    response = test_client.post("/api/v1/pets/bulk", json=pets)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_pet(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+
+    response = test_client.get(f"/api/v1/pets/{pet_id}/")
+    etag = response.headers["ETag"]
+
+    response = test_client.get(
+        f"/api/v1/pets/{pet_id}/", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Lists carry their own tag, which changes when any row changes
+    list_etag = test_client.get("/api/v1/pets/").headers["ETag"]
+    response = test_client.get("/api/v1/pets/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 304
+
+    test_client.put(f"/api/v1/pets/{pet_id}/", json={"price": 1.0})
+    response = test_client.get("/api/v1/pets/", headers={"If-None-Match": list_etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_update_pet_if_match(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+    etag = test_client.get(f"/api/v1/pets/{pet_id}/").headers["ETag"]
+
+    response = test_client.put(
+        f"/api/v1/pets/{pet_id}/", json={"name": "First"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # The second writer still holds the old tag and must refetch
+    response = test_client.put(
+        f"/api/v1/pets/{pet_id}/", json={"name": "Second"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+    assert test_client.get(f"/api/v1/pets/{pet_id}/").json()["name"] == "First"
+
+
+@pytest.mark.asyncio
+async def test_fast_path_json_matches_models(test_client, sample_pet):
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from app.api.models import Link, PetOut
+    from app.api.pets import URL_PREFIX
+
+    def model_json(content) -> bytes:
+        # What response_model validation + JSONResponse used to send
+        return JSONResponse(jsonable_encoder(content)).body
+
+    pet = {**sample_pet, "name": "Café 🐈", "price": 100, "image_url": None}
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+    expected = PetOut(
+        **{**pet, "id": pet_id},
+        links=[
+            Link(rel="self", href=f"{URL_PREFIX}/pets/{pet_id}/"),
+            Link(rel="collection", href=f"{URL_PREFIX}/pets/"),
+        ],
+    )
+
+    response = test_client.get(f"/api/v1/pets/{pet_id}/")
+    assert response.content == model_json(expected)
+
+    response = test_client.get("/api/v1/pets/")
+    assert response.content.startswith(b'{"data":[' + model_json(expected) + b"]")
+
+    response = test_client.get(f"/api/v1/pets/breeder/{pet['breeder_id']}/")
+    assert response.content == model_json([expected.model_copy(update={"links": None})])
+
+
+@pytest.mark.asyncio
+async def test_batch_get_pets(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    first = test_client.post("/api/v1/pets/", json={**pet, "name": "First"}).json()
+    second = test_client.post("/api/v1/pets/", json={**pet, "name": "Second"}).json()
+
+    response = test_client.post(
+        "/api/v1/pets/batch-get",
+        json={"ids": [second["id"], "no-such-pet", first["id"], second["id"]]},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    # Request order, duplicates collapsed, unknown ids reported
+    assert body["data"] == [second, first]
+    assert body["missing"] == ["no-such-pet"]
+
+    response = test_client.post("/api/v1/pets/batch-get", json={"ids": []})
+    assert response.json() == {"data": [], "missing": []}
+
+
+@pytest.mark.asyncio
+async def test_batch_get_pets_too_many_ids(test_client):
+    from app.api.pets import MAX_BATCH_GET_IDS
+
+    ids = [str(i) for i in range(MAX_BATCH_GET_IDS + 1)]
+    response = test_client.post("/api/v1/pets/batch-get", json={"ids": ids})
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_list_pets_with_fields(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    for name in ("A", "B", "C"):
+        test_client.post("/api/v1/pets/", json={**pet, "name": name})
+
+    response = test_client.get("/api/v1/pets/?limit=2&fields=price,name&links=false")
+    assert response.status_code == 200
+    body = response.json()
+    assert all(item.keys() == {"name", "price"} for item in body["data"])
+
+    # The next page keeps the same shape
+    next_url = next(link["href"] for link in body["links"] if link["rel"] == "next")
+    assert "fields=price%2Cname" in next_url and "links=false" in next_url
+    query = next_url.split("?", 1)[1]
+    (item,) = test_client.get(f"/api/v1/pets/?{query}").json()["data"]
+    assert item.keys() == {"name", "price"}
+
+    # A narrower representation has its own ETag
+    full_etag = test_client.get("/api/v1/pets/?limit=2").headers["ETag"]
+    assert response.headers["ETag"] != full_etag
+
+    (item, *_) = test_client.get("/api/v1/pets/?fields=id").json()["data"]
+    assert item.keys() == {"id", "links"}
+    assert item["links"][0]["href"].endswith(f"/pets/{item['id']}/")
+
+
+@pytest.mark.asyncio
+async def test_breeder_pets_with_fields(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    test_client.post("/api/v1/pets/", json=pet)
+
+    response = test_client.get(
+        f"/api/v1/pets/breeder/{pet['breeder_id']}/?fields=id,image_url"
+    )
+    assert response.status_code == 200
+    assert [item.keys() for item in response.json()] == [{"id", "image_url"}]
+
+    response = test_client.get(f"/api/v1/pets/breeder/{pet['breeder_id']}/?fields=x")
+    assert response.status_code == 400
+    assert response.json()["detail"]["fields"] == ["x"]
+
+
+@pytest.mark.asyncio
+async def test_patch_pet_writes_without_reading(test_client, sample_pet, monkeypatch):
+    from app.api import db_manager
+
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+
+    async def no_reads(id):
+        raise AssertionError("plain writes should not read the pet first")
+
+    monkeypatch.setattr(db_manager, "get_pet", no_reads)
+
+    response = test_client.patch(f"/api/v1/pets/{pet_id}/", json={"price": 5})
+    assert response.status_code == 200
+    assert response.json()["price"] == 5.0
+    assert response.json()["name"] == pet["name"]
+    assert response.headers["ETag"].startswith('"2-')
+
+    response = test_client.patch("/api/v1/pets/no-such-pet/", json={"price": 5})
+    assert response.status_code == 404
+
+    response = test_client.delete("/api/v1/pets/no-such-pet/")
+    assert response.status_code == 404
+    response = test_client.delete(f"/api/v1/pets/{pet_id}/")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_patch_pet_rejects_null_required_fields(test_client, sample_pet):
+    pet = {**sample_pet, "image_url": "http://img/x.jpg"}
+    pet_id = test_client.post("/api/v1/pets/", json=pet).json()["id"]
+
+    response = test_client.patch(f"/api/v1/pets/{pet_id}/", json={"name": None})
+    assert response.status_code == 422
+    assert response.json()["detail"]["fields"] == ["name"]
+
+    # Optional columns can be cleared
+    response = test_client.patch(f"/api/v1/pets/{pet_id}/", json={"image_url": None})
+    assert response.status_code == 200
+    assert response.json()["image_url"] is None
+
+
+@pytest.fixture
+def search_catalogue(test_client):
+    pets = [
+        ("Bella", "Dog", 120.0, "b1"),
+        ("Belle", "Cat", 80.0, "b1"),
+        ("Max", "Dog", 300.0, "b2"),
+        ("Rosa Bell", "Cat", 45.5, "b2"),
+        ("Luna", "Cat", 60.0, "b3"),
+    ]
+    test_client.post(
+        "/api/v1/pets/bulk",
+        json=[
+            {
+                "name": name,
+                "type": type,
+                "price": price,
+                "breeder_id": breeder_id,
+                "image_url": "http://img/x.jpg",
+            }
+            for name, type, price, breeder_id in pets
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_pets_by_name_and_price(test_client, search_catalogue):
+    response = test_client.get("/api/v1/pets/search?q=bel&sort=price")
+    assert response.status_code == 200
+    body = response.json()
+    assert [pet["name"] for pet in body["data"]] == ["Rosa Bell", "Belle", "Bella"]
+    assert body["total"] == 3
+    assert body["total_exact"] is True
+    assert body["facets"]["type"] == [
+        {"value": "Cat", "count": 2},
+        {"value": "Dog", "count": 1},
+    ]
+
+    response = test_client.get(
+        "/api/v1/pets/search?min_price=50&max_price=150&sort=-price&facets=false"
+    )
+    body = response.json()
+    assert [pet["name"] for pet in body["data"]] == ["Bella", "Belle", "Luna"]
+    assert body["facets"] is None
+
+
+@pytest.mark.asyncio
+async def test_search_pets_facets_and_paging(test_client, search_catalogue):
+    response = test_client.get("/api/v1/pets/search?type=Cat&limit=2&sort=name")
+    body = response.json()
+    assert [pet["name"] for pet in body["data"]] == ["Belle", "Luna"]
+    assert body["total"] == 3
+    assert {facet["value"]: facet["count"] for facet in body["facets"]["breeder_id"]} == {
+        "b1": 1,
+        "b2": 1,
+        "b3": 1,
+    }
+
+    next_url = next(link["href"] for link in body["links"] if link["rel"] == "next")
+    query = next_url.split("?", 1)[1]
+    body = test_client.get(f"/api/v1/pets/search?{query}").json()
+    assert [pet["name"] for pet in body["data"]] == ["Rosa Bell"]
+    assert not any(link["rel"] == "next" for link in body["links"])
+
+
+@pytest.mark.asyncio
+async def test_search_pets_follows_renames_and_rejects_bad_ranges(
+    test_client, search_catalogue
+):
+    pet_id = test_client.get("/api/v1/pets/search?q=max").json()["data"][0]["id"]
+    test_client.patch(f"/api/v1/pets/{pet_id}/", json={"name": "Maxine"})
+    assert test_client.get("/api/v1/pets/search?q=maxi").json()["total"] == 1
+
+    response = test_client.get("/api/v1/pets/search?min_price=10&max_price=5")
+    assert response.status_code == 400
+    response = test_client.get("/api/v1/pets/search?limit=0")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_pets_caps_facet_counting(
+    test_client, search_catalogue, monkeypatch
+):
+    from app.api import db_manager
+
+    monkeypatch.setattr(db_manager, "FACET_SCAN_LIMIT", 2)
+
+    body = test_client.get("/api/v1/pets/search?type=Cat").json()
+    assert len(body["data"]) == 3
+    assert body["total"] == 2
+    assert body["total_exact"] is False
+
+
+@pytest.mark.asyncio
+async def test_changes_feed_records_every_write(test_client, sample_pet):
+    pet = {**sample_pet, "id": "feed-1", "image_url": "http://img/x.jpg"}
+    test_client.post("/api/v1/pets/", json=pet)
+    test_client.patch("/api/v1/pets/feed-1/", json={"price": 5.0})
+    test_client.post("/api/v1/pets/bulk", json=[{**pet, "id": "feed-2"}, pet])
+    test_client.delete("/api/v1/pets/feed-1/")
+    test_client.delete("/api/v1/pets/delete/all/")
+
+    body = test_client.get("/api/v1/pets/changes?since=0").json()
+    changes = body["data"]
+    assert [(change["op"], change["id"]) for change in changes] == [
+        ("create", "feed-1"),
+        ("update", "feed-1"),
+        ("create", "feed-2"),
+        ("update", "feed-1"),
+        ("delete", "feed-1"),
+        ("delete_all", None),
+    ]
+    seqs = [change["seq"] for change in changes]
+    assert seqs == sorted(set(seqs))
+    assert changes[1]["pet"] == {**changes[0]["pet"], "price": 5.0, "version": 2}
+    assert changes[4]["pet"] is None
+
+    # Batches of ?limit=, continued from "next"
+    first = test_client.get("/api/v1/pets/changes?since=0&limit=4").json()
+    assert first["next"] == seqs[3]
+    rest = test_client.get(f"/api/v1/pets/changes?since={first['next']}").json()
+    assert [change["seq"] for change in rest["data"]] == seqs[4:]
+    assert rest["links"][-1]["href"].endswith(f"/pets/changes?since={seqs[-1]}")
+
+    assert test_client.get("/api/v1/pets/changes?since=-1").status_code == 400
+    assert test_client.get("/api/v1/pets/changes?limit=0").status_code == 400
+    assert test_client.get("/api/v1/pets/changes?wait=1000").status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_changes_long_poll_wakes_on_write(sample_pet, monkeypatch):
+    import asyncio
+    import time
+
+    from app.api import db_manager
+    from app.api.changes import change_feed
+    from app.api.models import PetIn
+
+    # Only a wake-up can end the wait early
+    monkeypatch.setattr(change_feed, "poll_interval", 30)
+    start = time.monotonic()
+    waiting = asyncio.create_task(
+        change_feed.wait(lambda: db_manager.get_changes(0, 10), timeout=30)
+    )
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    await db_manager.add_pet(PetIn(**sample_pet), pet_id="feed-wake")
+    changes = await asyncio.wait_for(waiting, 5)
+    assert [change["id"] for change in changes] == ["feed-wake"]
+    assert time.monotonic() - start < 5
+
+
+@pytest.mark.asyncio
+async def test_changes_event_stream_resumes_from_last_event_id(
+    test_client, sample_pet
+):
+    for i in range(3):
+        pet = {**sample_pet, "id": f"sse-{i}", "image_url": "http://img/x.jpg"}
+        test_client.post("/api/v1/pets/", json=pet)
+    seqs = [c["seq"] for c in test_client.get("/api/v1/pets/changes").json()["data"]]
+
+    response = test_client.get(
+        "/api/v1/pets/changes?wait=0.1",
+        headers={"Accept": "text/event-stream", "Last-Event-ID": str(seqs[0])},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        block for block in response.text.split("\n\n") if block.startswith("id:")
+    ]
+    assert [event.splitlines()[0] for event in events] == [
+        f"id: {seq}" for seq in seqs[1:]
+    ]
+    assert '"id": "sse-2"' in events[-1]
+
+
+@pytest.mark.asyncio
+async def test_changes_wait_at_sequence_gaps(test_database, monkeypatch):
+    import time
+
+    from app.api import db_manager
+
+    now = time.time()
+    for seq, changed_at in [(1, now), (3, now - 60), (5, now)]:
+        await test_database.execute(
+            "INSERT INTO pet_changes (seq, op, pet_id, changed_at) "
+            "VALUES (:seq, 'delete', 'gap', :changed_at)",
+            values={"seq": seq, "changed_at": changed_at},
+        )
+
+    # 2 was drawn a minute before 3 committed: rolled back, so passed over.
+    # 4 may still commit, so 5 is held back until the gap is old enough
+    changes = await db_manager.get_changes(0, 10)
+    assert [change["seq"] for change in changes] == [1, 3]
+    assert await db_manager.get_changes(3, 10) == []
+
+    monkeypatch.setattr(db_manager.settings, "CHANGES_GAP_TIMEOUT", 0)
+    assert [change["seq"] for change in await db_manager.get_changes(3, 10)] == [5]
+
+
+@pytest.mark.asyncio
+async def test_changes_from_start_wait_at_first_gap(test_database):
+    import time
+
+    from app.api import db_manager
+
+    # 1 is still being written when 2 commits: a new consumer must not skip it
+    await test_database.execute(
+        "INSERT INTO pet_changes (seq, op, pet_id, changed_at) "
+        "VALUES (2, 'delete', 'gap', :changed_at)",
+        values={"changed_at": time.time()},
+    )
+    assert await db_manager.get_changes(0, 10) == []
+
+
+@pytest.mark.asyncio
+async def test_changes_pruned_past_since_are_gone(test_client, test_database):
+    import time
+
+    from app.api import db_manager
+
+    now = time.time()
+    for seq, changed_at in [(1, now - 60), (2, now - 60), (3, now)]:
+        await test_database.execute(
+            "INSERT INTO pet_changes (seq, op, pet_id, changed_at) "
+            "VALUES (:seq, 'delete', 'old', :changed_at)",
+            values={"seq": seq, "changed_at": changed_at},
+        )
+    assert await db_manager.prune_changes(now - 30) == 2
+    assert await db_manager.get_changes_pruned() == 2
+
+    assert test_client.get("/api/v1/pets/changes?since=1").status_code == 410
+    # New consumers, and those up to date with the pruned ones, read on
+    for since in (0, 2):
+        body = test_client.get(f"/api/v1/pets/changes?since={since}").json()
+        assert [change["seq"] for change in body["data"]] == [3]
+
+
+@pytest.mark.asyncio
+async def test_pet_stats_follow_writes(test_client, sample_pet):
+    from app.api import db_manager
+
+    prices = [float(price) for price in range(1, 101)]
+    test_client.post(
+        "/api/v1/pets/bulk",
+        json=[
+            {
+                **sample_pet,
+                "id": f"stats-{i}",
+                "type": "Dog" if i % 2 else "Cat",
+                "price": price,
+                "breeder_id": "b1",
+                "image_url": "http://img/x.jpg",
+            }
+            for i, price in enumerate(prices)
+        ],
+    )
+    # Nothing until the deltas are folded in
+    assert test_client.get("/api/v1/pets/stats").json()["data"] == []
+    assert await db_manager.fold_pet_stats() == 200
+
+    body = test_client.get("/api/v1/pets/stats?by=breeder").json()
+    assert body["by"] == "breeder"
+    [breeder] = body["data"]
+    assert breeder["value"] == "b1"
+    assert (breeder["count"], breeder["min"], breeder["max"]) == (100, 1.0, 100.0)
+    assert breeder["avg"] == 50.5
+    # Within 1% of the exact nearest-rank percentiles
+    for name, exact in (("p50", 50), ("p90", 90), ("p99", 99)):
+        assert breeder[name] == pytest.approx(exact, rel=0.01)
+
+    cats, dogs = test_client.get("/api/v1/pets/stats").json()["data"]
+    assert (cats["value"], cats["count"], cats["max"]) == ("Cat", 50, 99.0)
+    assert (dogs["value"], dogs["count"], dogs["min"]) == ("Dog", 50, 2.0)
+
+    test_client.patch("/api/v1/pets/stats-1/", json={"type": "Bird", "price": 1000})
+    test_client.delete("/api/v1/pets/stats-0/")
+    await db_manager.fold_pet_stats()
+    body = test_client.get("/api/v1/pets/stats?by=type&limit=2").json()
+    assert [(row["value"], row["count"]) for row in body["data"]] == [
+        ("Bird", 1),
+        ("Cat", 49),
+    ]
+    assert body["data"][0]["p50"] == 1000.0
+    next_url = next(link["href"] for link in body["links"] if link["rel"] == "next")
+    query = next_url.split("?", 1)[1]
+    [dogs] = test_client.get(f"/api/v1/pets/stats?{query}").json()["data"]
+    assert (dogs["count"], dogs["min"]) == (49, 4.0)
+    dogs = test_client.get("/api/v1/pets/stats?value=Dog").json()["data"][0]
+    assert dogs["avg"] == round((sum(prices[1::2]) - 2.0) / 49, 2)
+
+    test_client.delete("/api/v1/pets/delete/all/")
+    await db_manager.fold_pet_stats()
+    assert test_client.get("/api/v1/pets/stats?by=breeder").json()["data"] == []
+    assert test_client.get("/api/v1/pets/stats?by=price").status_code == 422
+    assert test_client.get("/api/v1/pets/stats?limit=0").status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_pet_stats_backfill_matches_incremental(test_client, test_database):
+    from app.api import db_manager
+    from app.api.migrations import create_pet_stats_tables
+
+    test_client.post(
+        "/api/v1/pets/bulk",
+        json=[
+            {
+                "id": f"backfill-{i}",
+                "name": f"Pet {i}",
+                "type": ("Dog", "Cat", "Fish")[i % 3],
+                "price": round(5 + i * 7.3, 2),
+                "breeder_id": f"b{i % 4}",
+                "image_url": "http://img/x.jpg",
+            }
+            for i in range(60)
+        ],
+    )
+    await db_manager.fold_pet_stats()
+    incremental = [
+        await db_manager.get_pet_stats(by, None, 100, 0) for by in ("type", "breeder")
+    ]
+
+    # As if the pets predated the stats tables
+    for table in ("pet_stat_deltas", "pet_stat_buckets", "pet_stats"):
+        await test_database.execute(f"DELETE FROM {table}")
+    await create_pet_stats_tables(test_database)
+    await db_manager.fold_pet_stats()
+    backfilled = [
+        await db_manager.get_pet_stats(by, None, 100, 0) for by in ("type", "breeder")
+    ]
+
+    def without_timestamps(stats):
+        return [[{**row, "updated_at": None} for row in rows] for rows in stats]
+
+    assert without_timestamps(backfilled) == without_timestamps(incremental)
+    assert [row["count"] for row in backfilled[1]] == [15, 15, 15, 15]